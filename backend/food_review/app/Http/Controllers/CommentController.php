@@ -28,6 +28,8 @@ public function store(Request $request)
             'content' => $request->content,
         ]);
 
+        $this->pushInteraction(Auth::id(), $comment->review->restaurant_id, 'comment', $comment->id);
+
         return response()->json([
             'message' => 'Comment added successfully',
             'comment' => $comment
@@ -68,6 +70,8 @@ public function destroy($id)
 
         $comment->delete();
 
+        $this->notifyRecommender('comment');
+
         return response()->json(['message' => 'Comment deleted successfully']);
     }
 
@@ -5,8 +5,45 @@
 use Illuminate\Foundation\Auth\Access\AuthorizesRequests;
 use Illuminate\Foundation\Validation\ValidatesRequests;
 use Illuminate\Routing\Controller as BaseController;
+use Illuminate\Support\Facades\Http;
 
 class Controller extends BaseController
 {
     use AuthorizesRequests, ValidatesRequests;
+
+    // 🔔 Báo service gợi ý (Flask) có hành vi mới để train lại sớm
+    protected function notifyRecommender(string $kind): void
+    {
+        try {
+            Http::timeout(1)->post(config('services.recommender.url') . '/model/refresh-hint', [
+                'kind' => $kind,
+            ]);
+        } catch (\Throwable $e) {
+            // Hint chỉ để model cập nhật nhanh hơn — lỗi không ảnh hưởng request chính
+        }
+    }
+
+    // ⚡ Áp hành vi mới thẳng vào model đang chạy (gợi ý đổi ngay, không chờ train lại)
+    // $sourceId: id dòng vừa tạo (reviews.id, likes.id, ...) → Flask không cộng trùng khi nạp snapshot mới
+    protected function pushInteraction(int $userId, int $restaurantId, string $kind, int $sourceId, ?int $rating = null): void
+    {
+        try {
+            $response = Http::timeout(1)->post(config('services.recommender.url') . '/interactions', [
+                'user_id'       => $userId,
+                'restaurant_id' => $restaurantId,
+                'kind'          => $kind,
+                'rating'        => $rating,
+                'source_id'     => $sourceId,
+            ]);
+            if ($response->successful()) {
+                return;
+            }
+        } catch (\Throwable $e) {
+            // Flask không phản hồi → gửi hint bên dưới
+        }
+
+        // Http::post không throw với 4xx/5xx (vd. quán mới chưa có trong model)
+        // → báo trainer nạp lại sớm thay vì chờ tới MAX_STALENESS
+        $this->notifyRecommender($kind);
+    }
 }
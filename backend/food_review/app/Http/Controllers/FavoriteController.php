@@ -26,6 +26,8 @@ public function store($restaurantId)
             'restaurant_id' => $restaurantId
         ]);
 
+        $this->pushInteraction($user->id, (int) $restaurantId, 'favorite', $favorite->id);
+
         return response()->json([
             'message' => 'Added to favorites',
             'favorite' => $favorite->load('restaurant')
@@ -47,6 +49,8 @@ public function destroy($restaurantId)
 
         $favorite->delete();
 
+        $this->notifyRecommender('favorite');
+
         return response()->json(['message' => 'Removed from favorites']);
     }
 
@@ -32,11 +32,13 @@ public function store($reviewId)
             ]);
         }
 
-        Like::create([
+        $like = Like::create([
             'user_id' => $user->id,
             'review_id' => $reviewId,
         ]);
 
+        $this->pushInteraction($user->id, $review->restaurant_id, 'like', $like->id);
+
         return response()->json([
             'success' => true,
             'message' => 'Liked successfully',
@@ -70,6 +72,8 @@ public function destroy($reviewId)
 
         $like->delete();
 
+        $this->notifyRecommender('like');
+
         return response()->json([
             'success' => true,
             'message' => 'Unliked successfully',
@@ -20,33 +20,36 @@ public function recommend(Request $request)
         $topN = $request->query('top_n', 5);
         $alpha = $request->query('alpha', 0.6);
 
-        // ✅ Gọi Flask API với userId
-       $response = Http::get('http://172.20.10.10:5000/recommend', [
-    'user_id'   => $userId,
-    'top_n'     => $topN,
-    'alpha_cf'  => $alpha,         // sửa key
-    'alpha_cbf' => 1 - $alpha,     // đảm bảo tổng = 1
-]);
-
+        // ✅ Gọi Flask API với userId (include=card: Flask trả kèm thẻ quán dựng sẵn)
+        $response = Http::get(config('services.recommender.url') . '/recommend', [
+            'user_id'   => $userId,
+            'top_n'     => $topN,
+            'alpha_cf'  => $alpha,         // sửa key
+            'alpha_cbf' => 1 - $alpha,     // đảm bảo tổng = 1
+            'include'   => 'card',
+        ]);
 
         if ($response->successful()) {
             $data = $response->json();
 
-            // Lấy danh sách ID quán
-            $ids = collect($data['recommendations'])->pluck('id')->toArray();
+            $items = collect($data['recommendations']);
 
-            // Lấy thông tin từ DB
-            $restaurants = Restaurant::whereIn('id', $ids)->get(['id', 'name', 'address', 'image_url']);
+            // Chỉ query DB cho quán thiếu thẻ (model cũ / quán vừa thêm)
+            $missing = $items->filter(fn ($item) => empty($item['card']))->pluck('id')->toArray();
+            $restaurants = $missing
+                ? Restaurant::whereIn('id', $missing)->get(['id', 'name', 'address', 'image_url'])
+                : collect();
 
-            // Kết hợp Flask score + DB info
-            $recommendations = collect($data['recommendations'])->map(function ($item) use ($restaurants) {
-                $rest = $restaurants->firstWhere('id', $item['id']);
+            // Kết hợp Flask score + thẻ quán (hoặc DB khi thiếu thẻ)
+            $recommendations = $items->map(function ($item) use ($restaurants) {
+                $card = $item['card'] ?? null;
+                $rest = $card ? null : $restaurants->firstWhere('id', $item['id']);
                 return [
                     'id'       => $item['id'],
-                    'name'     => $rest ? $rest->name : $item['name'],
+                    'name'     => $card['name'] ?? ($rest ? $rest->name : $item['name']),
                     'score'    => $item['score'],
-                    'address'  => $rest ? $rest->address : null,
-                    'image_url'=> $rest ? $rest->image_url : null,
+                    'address'  => $card ? $card['address'] : ($rest ? $rest->address : null),
+                    'image_url'=> $card ? $card['image_url'] : ($rest ? $rest->image_url : null),
                 ];
             });
 
@@ -155,6 +155,8 @@ public function store(Request $request)
             return $review;
         });
 
+        $this->pushInteraction(Auth::id(), $review->restaurant_id, 'review', $review->id, $review->rating);
+
         return response()->json([
             'message' => 'Review created successfully',
             'review'  => $review->load('images', 'user', 'restaurant'),
@@ -200,6 +202,8 @@ public function update(Request $request, $review_id)
             }
         });
 
+        $this->notifyRecommender('review');
+
         return response()->json($review->load('images', 'user', 'restaurant'));
     }
 
@@ -221,6 +225,8 @@ public function destroy($review_id)
             $review->delete();
         });
 
+        $this->notifyRecommender('review');
+
         return response()->json(['message' => 'Review đã được xóa thành công.']);
     }
 
@@ -232,7 +238,12 @@ public function like($review_id)
         $user = Auth::user();
         $review = Review::findOrFail($review_id);
 
-        $review->likes()->firstOrCreate(['user_id' => $user->id]);
+        $like = $review->likes()->firstOrCreate(['user_id' => $user->id]);
+
+        // Chỉ đẩy hành vi khi like mới được tạo (like lại không tính thêm lần nữa)
+        if ($like->wasRecentlyCreated) {
+            $this->pushInteraction($user->id, $review->restaurant_id, 'like', $like->id);
+        }
 
         return response()->json([
             'success' => true,
@@ -249,6 +260,8 @@ public function unlike($review_id)
 
         $review->likes()->where('user_id', $user->id)->delete();
 
+        $this->notifyRecommender('like');
+
         return response()->json([
             'success' => true,
             'message' => 'Unliked',
@@ -277,6 +290,8 @@ public function comment(Request $request, $id)
 
         $comment->load('user');
 
+        $this->pushInteraction(auth()->id(), $review->restaurant_id, 'comment', $comment->id);
+
         return response()->json([
             'message' => 'Comment added successfully',
             'comment' => $comment,
@@ -429,6 +444,8 @@ public function storeWithRestaurant(Request $request)
             return $review->load('images', 'user', 'restaurant');
         });
 
+        $this->notifyRecommender('review');
+
         return response()->json([
             'message' => 'Review và nhà hàng được tạo thành công',
             'review' => $review,
@@ -33,6 +33,9 @@
     'mapbox' => [
     'token' => env('MAPBOX_TOKEN'),
 ],
+    'recommender' => [
+        'url' => env('RECOMMENDER_URL', 'http://172.20.10.10:5000'),
+    ],
 
 
 ];
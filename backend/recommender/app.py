@@ -1,64 +1,322 @@
-from flask import Flask, request, jsonify
-from hybrid import hybrid_recommend
-from auto_trainer import start_auto_trainer
-from model_state import model_summary, model_data
+from flask import Flask, Response, request, jsonify
+from hybrid import hybrid_recommend, CF_SOURCES, DEFAULT_CF_MODE
+from auto_trainer import start_auto_trainer, request_refresh, trainer_status, apply_source_weights
+from source_weights import current_weights
+from model_state import (model_summary, model_data, model_overlay, model_revision,
+                         with_bound_model)
+from online_update import apply_interaction, online_summary, INTERACTION_KINDS
+from cards import render_recommendations, RESPONSE_FORMATS, INCLUDE_OPTIONS, msgpack
+from request_budget import (Deadline, admission, recommend_within_budget, popular_recommendations,
+                            DEFAULT_BUDGET_MS, MAX_BUDGET_MS, MODE_POPULAR)
+from variants import registry as variants
+from feed import (feed_cache, feed_key, encode_cursor, decode_cursor, build_ranked_list,
+                  page_frame, CursorError, FEED_LENGTH, FEED_PAGE_SIZE, MAX_PAGE_SIZE,
+                  FEED_BUDGET_MS)
 import os
+import traceback
 
 app = Flask(__name__)
 
+# Chế độ trainer: thread | process | external (xem auto_trainer.TRAINER_MODES)
+TRAINER_MODE = os.environ.get("TRAINER_MODE", "thread")
+
 # 🚀 Chỉ khởi động auto-trainer 1 lần khi Flask reload
 if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-    start_auto_trainer(interval=60)
+    start_auto_trainer(mode=TRAINER_MODE)
+
+
+def _hybrid_compute(deadline, **params):
+    """Hàm tính gợi ý cho recommend_within_budget (cột score, giữ nhãn mode / degraded)."""
+    def compute():
+        recs = hybrid_recommend(deadline=deadline, **params)
+        attrs = dict(recs.attrs)
+        recs = recs.rename(columns={'score_final': 'score'})
+        recs.attrs.update(attrs)
+        return recs
+    return compute
 
 
 # ==========================================================
 # 🧠 API chính: Gợi ý quán ăn
 # ==========================================================
 @app.route("/recommend", methods=["GET"])
+@with_bound_model
 def recommend():
+    user_id = request.args.get("user_id", type=int)
+    top_n = request.args.get("top_n", default=5, type=int)
+    alpha_cf = request.args.get("alpha_cf", default=0.6, type=float)
+    alpha_cbf = request.args.get("alpha_cbf", default=0.4, type=float)
+    min_ratings = request.args.get("min_ratings", default=1, type=int)
+    cf_mode = request.args.get("cf_mode")    # mặc định theo variant (DEFAULT_CF_MODE)
+    # include=card: kèm thẻ quán (Laravel không cần query DB lại)
+    include = [x for x in request.args.get("include", "").split(",") if x]
+    fmt = request.args.get("format", default="json")
+    # budget_ms: thời gian tối đa cho CF/CBF, quá hạn → danh sách phổ biến
+    budget_ms = request.args.get("budget_ms", default=DEFAULT_BUDGET_MS, type=int)
+    # variant: ép 1 variant đang bật (QA); mặc định chia theo hash user_id
+    variant = request.args.get("variant")
+
+    if user_id is None:
+        return jsonify({"error": "user_id is required"}), 400
+    if top_n is None or top_n <= 0:
+        return jsonify({"error": "top_n must be a positive integer"}), 400
+    if cf_mode is not None and cf_mode not in CF_SOURCES:
+        return jsonify({"error": f"cf_mode must be one of: {', '.join(CF_SOURCES)}"}), 400
+    if any(x not in INCLUDE_OPTIONS for x in include):
+        return jsonify({"error": f"include must be one of: {', '.join(INCLUDE_OPTIONS)}"}), 400
+    if fmt not in RESPONSE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(RESPONSE_FORMATS)}"}), 400
+    if fmt == "msgpack" and msgpack is None:
+        return jsonify({"error": "format=msgpack cần cài gói msgpack"}), 406
+    if budget_ms is None or not 0 < budget_ms <= MAX_BUDGET_MS:
+        return jsonify({"error": f"budget_ms must be in (0, {MAX_BUDGET_MS}]"}), 400
+    if variant is not None and variant not in variants.stats:
+        return jsonify({"error": f"variant must be one of: {', '.join(variants.stats)}"}), 400
+
+    # Kiểm tra model đã sẵn sàng chưa
+    if (
+        model_data.get("all_data") is None or
+        model_data.get("restaurants") is None
+    ):
+        return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
+
+    variant = variant or variants.route(user_id)
+    if cf_mode is not None and not variants.supports(variant, cf_mode):
+        return jsonify({"error": f"cf_mode={cf_mode} không dùng được với variant {variant}"}), 400
+
+    # 🚦 Quá nhiều request đang xử lý → từ chối sớm để giữ độ trễ đuôi
+    if not admission.enter():
+        return jsonify({"error": "Quá tải, vui lòng thử lại sau"}), 429, {"Retry-After": "1"}
     try:
-        user_id = request.args.get("user_id", type=int)
-        top_n = request.args.get("top_n", default=5, type=int)
+        deadline = Deadline(budget_ms)
+
+        # Đọc model qua overlay của variant (mảng gốc dùng chung)
+        with model_overlay(variants.overlay(variant)):
+            mode_cf = cf_mode or model_data.get("cf_mode", DEFAULT_CF_MODE)
+
+            # 🔹 Gọi hàm gợi ý (trong budget; quá hạn / quá tải → phổ biến)
+            compute = _hybrid_compute(
+                deadline,
+                user_id=user_id,
+                top_n=top_n,
+                alpha_cf=alpha_cf,
+                alpha_cbf=alpha_cbf,
+                min_ratings=min_ratings,
+                cf_mode=mode_cf
+            )
+            top_recs, meta = recommend_within_budget(compute, user_id, top_n, deadline)
+            meta["variant"] = variant
+            # Snapshot đã gắn cho request → đúng model đã tính (loadtest đọc để đếm version)
+            meta["version"], meta["revision"] = model_revision()
+            variants.record(variant, meta["elapsed_ms"], degraded=meta["degraded"])
+            if top_recs is None:
+                return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau", **meta}), 503
+
+            try:
+                body, mimetype = render_recommendations(user_id, top_recs, model_data,
+                                                        include=include, fmt=fmt, meta=meta)
+            except Exception:
+                # Lỗi lúc dựng response (vd. thẻ quán hỏng) → danh sách phổ biến, không kèm thẻ
+                print(f"❌ [Recommend] Lỗi render gợi ý user {user_id}:\n{traceback.format_exc()}")
+                top_recs = popular_recommendations(user_id, top_n)
+                if top_recs is None:
+                    return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
+                meta.update(mode=MODE_POPULAR, degraded="render_error")
+                body, mimetype = render_recommendations(user_id, top_recs, model_data,
+                                                        fmt=fmt, meta=meta)
+        return Response(body, mimetype=mimetype)
+    finally:
+        admission.leave()
+
+
+# ==========================================================
+# 📜 Feed cuộn vô hạn: phân trang bằng cursor
+# ==========================================================
+@app.route("/feed", methods=["GET"])
+@with_bound_model
+def feed():
+    user_id = request.args.get("user_id", type=int)
+    page_size = request.args.get("page_size", default=FEED_PAGE_SIZE, type=int)
+    cursor = request.args.get("cursor")
+    include = [x for x in request.args.get("include", "").split(",") if x]
+    fmt = request.args.get("format", default="json")
+
+    if user_id is None:
+        return jsonify({"error": "user_id is required"}), 400
+    if page_size is None or not 0 < page_size <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"page_size must be in (0, {MAX_PAGE_SIZE}]"}), 400
+    if any(x not in INCLUDE_OPTIONS for x in include):
+        return jsonify({"error": f"include must be one of: {', '.join(INCLUDE_OPTIONS)}"}), 400
+    if fmt not in RESPONSE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(RESPONSE_FORMATS)}"}), 400
+    if fmt == "msgpack" and msgpack is None:
+        return jsonify({"error": "format=msgpack cần cài gói msgpack"}), 406
+
+    if cursor:
+        # 🔖 Trang tiếp: chỉ cắt danh sách đã cache của đúng version / revision lúc bắt đầu cuộn
+        try:
+            revision, key, offset = decode_cursor(cursor, user_id)
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        entry = feed_cache.get(user_id, revision, key)
+        if entry is None:
+            return jsonify({"error": "cursor đã hết hạn, vui lòng tải lại feed từ đầu"}), 410
+        variant = key[0]
+    else:
+        # 🆕 Trang đầu: tính 1 danh sách dài rồi cache
         alpha_cf = request.args.get("alpha_cf", default=0.6, type=float)
         alpha_cbf = request.args.get("alpha_cbf", default=0.4, type=float)
-        min_ratings = request.args.get("min_ratings", default=1, type=int)
+        cf_mode = request.args.get("cf_mode")
+        variant = request.args.get("variant")
+        budget_ms = request.args.get("budget_ms", default=FEED_BUDGET_MS, type=int)
+        if cf_mode is not None and cf_mode not in CF_SOURCES:
+            return jsonify({"error": f"cf_mode must be one of: {', '.join(CF_SOURCES)}"}), 400
+        if variant is not None and variant not in variants.stats:
+            return jsonify({"error": f"variant must be one of: {', '.join(variants.stats)}"}), 400
+        if budget_ms is None or not 0 < budget_ms <= MAX_BUDGET_MS:
+            return jsonify({"error": f"budget_ms must be in (0, {MAX_BUDGET_MS}]"}), 400
+        if model_data.get("item_ids") is None:
+            return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
 
-        if user_id is None:
-            return jsonify({"error": "user_id is required"}), 400
+        variant = variant or variants.route(user_id)
+        if cf_mode is not None and not variants.supports(variant, cf_mode):
+            return jsonify({"error": f"cf_mode={cf_mode} không dùng được với variant {variant}"}), 400
+        offset = 0
+        if not admission.enter():
+            return jsonify({"error": "Quá tải, vui lòng thử lại sau"}), 429, {"Retry-After": "1"}
+        try:
+            deadline = Deadline(budget_ms)
+            with model_overlay(variants.overlay(variant)):
+                mode_cf = cf_mode or model_data.get("cf_mode", DEFAULT_CF_MODE)
+                key = feed_key(variant, mode_cf, alpha_cf, alpha_cbf)
+                # Cùng snapshot đã gắn cho request với phép tính bên dưới → publish giữa chừng
+                # không thể cache danh sách của model mới dưới revision cũ
+                revision = model_revision()
+                entry = feed_cache.get(user_id, revision, key)
+                if entry is None or entry[3] is not None:
+                    # Chưa có hoặc chỉ có bản degraded (chỉ để cursor cũ cuộn tiếp) → tính lại
+                    compute = _hybrid_compute(
+                        deadline,
+                        user_id=user_id,
+                        top_n=FEED_LENGTH,
+                        alpha_cf=alpha_cf,
+                        alpha_cbf=alpha_cbf,
+                        cf_mode=mode_cf,
+                        candidate_pool=FEED_LENGTH
+                    )
+                    recs, meta = recommend_within_budget(compute, user_id, FEED_LENGTH, deadline)
+                    variants.record(variant, meta["elapsed_ms"], degraded=meta["degraded"])
+                    if recs is None:
+                        return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
+                    entry = build_ranked_list(recs, user_id, FEED_LENGTH, mode=meta["mode"],
+                                              degraded=meta["degraded"])
+                    feed_cache.put(user_id, revision, key, entry)
+        finally:
+            admission.leave()
 
-        # Kiểm tra model đã sẵn sàng chưa
-        if (
-            model_data.get("all_data") is None or
-            model_data.get("restaurants") is None
-        ):
-            return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
+    page = page_frame(entry, offset, page_size)
+    next_offset = offset + len(page)
+    meta = {"version": revision[0], "revision": revision[1], "variant": variant,
+            "mode": entry[2], "degraded": entry[3]}
+    meta["next_cursor"] = (encode_cursor(user_id, revision, key, next_offset)
+                           if next_offset < len(entry[0]) else None)
+    body, mimetype = render_recommendations(user_id, page, model_data,
+                                            include=include, fmt=fmt, meta=meta)
+    return Response(body, mimetype=mimetype)
 
-        # 🔹 Gọi hàm gợi ý
-        top_recs = hybrid_recommend(
-            user_id=user_id,
-            top_n=top_n,
-            alpha_cf=alpha_cf,
-            alpha_cbf=alpha_cbf,
-            min_ratings=min_ratings
-        )
 
-        recommendations = top_recs.rename(columns={'score_final': 'score'}).to_dict(orient='records')
+# ==========================================================
+# ⚡ Áp 1 hành vi mới vào model đang chạy (không cần train lại)
+# ==========================================================
+@app.route("/interactions", methods=["POST"])
+@with_bound_model
+def interactions():
+    payload = request.get_json(silent=True) or {}
+    try:
+        user_id = int(payload["user_id"])
+        restaurant_id = int(payload["restaurant_id"])
+        rating = payload.get("rating")
+        rating = float(rating) if rating is not None else None
+        # id dòng vừa ghi (reviews.id, likes.id, ...) → đối soát với snapshot, không cộng trùng
+        source_id = payload.get("source_id")
+        source_id = int(source_id) if source_id is not None else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "user_id, restaurant_id (số nguyên) là bắt buộc; source_id là số nguyên"}), 400
+    kind = payload.get("kind", "review")
 
-        return jsonify({
-            "user_id": user_id,
-            "recommendations": recommendations
-        })
+    if kind in INTERACTION_KINDS:
+        # Vẫn báo trainer (gom theo MIN_GAP): quán mới, nội dung review... chỉ vào model qua vòng train
+        request_refresh(kind)
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    if model_data.get("item_ids") is None:
+        return jsonify({"error": "Model chưa sẵn sàng, vui lòng thử lại sau"}), 503
+
+    try:
+        mean = apply_interaction(user_id, restaurant_id, rating=rating, kind=kind,
+                                 source_id=source_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "user_id": user_id,
+        "restaurant_id": restaurant_id,
+        "kind": kind,
+        "rating": mean,
+        "version": model_data["version"]
+    })
 
 
 # ==========================================================
 # 🔍 API kiểm tra trạng thái model
 # ==========================================================
 @app.route("/model-status", methods=["GET"])
+@with_bound_model
 def model_status():
-    return jsonify(model_summary())
+    return jsonify({**model_summary(), **online_summary(), "trainer": trainer_status(),
+                    "serving": admission.status(), "variants": variants.status(),
+                    "feed_cache": feed_cache.status()})
+
+
+# ==========================================================
+# 🔔 Laravel báo có dữ liệu mới → trainer gom hint & train lại
+# ==========================================================
+@app.route("/model/refresh-hint", methods=["POST"])
+def refresh_hint():
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get("kind") or request.args.get("kind", "unknown")
+    if not request_refresh(kind):
+        return jsonify({"error": "AutoTrainer chưa khởi động"}), 503
+    return jsonify({"accepted": True, "kind": kind}), 202
+
+
+# ==========================================================
+# ⚖️ Trọng số các nguồn hành vi (reviews / favorites / likes / comments)
+# ==========================================================
+@app.route("/model/weights", methods=["GET"])
+@with_bound_model
+def get_weights():
+    sources = model_data.get("interaction_sources")
+    return jsonify({
+        "weights": current_weights(),
+        "model_weights": model_data.get("source_weights"),
+        "sources": sources.summary() if sources is not None else None,
+        "version": model_data["version"],
+        "revision": model_data["revision"]
+    })
+
+
+@app.route("/model/weights", methods=["POST"])
+def update_weights():
+    payload = request.get_json(silent=True)
+    try:
+        weights, revision = apply_source_weights(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if revision is None:
+        # Trọng số đã lưu, sẽ áp dụng ở vòng train kế tiếp
+        return jsonify({"weights": weights, "applied": False}), 202
+    version, revision = revision
+    return jsonify({"weights": weights, "applied": True, "version": version, "revision": revision})
 
 
 # ==========================================================
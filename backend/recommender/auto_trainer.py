@@ -2,20 +2,63 @@
 # auto_trainer.py — Tự động nạp dữ liệu & huấn luyện lại model AI
 # ==========================================================
 
+import argparse
+import atexit
+import os
+import subprocess
+import sys
 import time
 import threading
 from datetime import datetime
-import pandas as pd
+from functools import partial
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
-from data_loader import load_all_data, load_restaurants, load_categories
-from model_state import model_data
+from data_loader import load_training_snapshot, load_review_texts, DataLoadError, DEFAULT_SOURCE_WEIGHTS
+from model_state import publish_model, model_revision, bind_model
+import model_store
+from text_features import HashingFeatureState, ReviewTextAggregates, blend_features
+from cards import build_restaurant_cards
+from source_weights import SourceMatrices, current_weights, set_weights, validate_weights
+from retrain_scheduler import RetrainScheduler, touch_hint_file, MIN_GAP, MAX_STALENESS
+from variants import VARIANTS, ACTIVE_VARIANTS, parse_active
+
+# --- Chế độ vector hóa đặc trưng quán (CBF) ---
+# - "tfidf":   TfidfVectorizer fit lại toàn bộ mỗi vòng (từ điển lớn dần theo catalog)
+# - "hashing": HashingVectorizer số chiều cố định + IDF làm mới định kỳ (text_features.py)
+FEATURE_MODE = "tfidf"
+
+_hashing_state = None     # HashingFeatureState, giữ qua các vòng trong tiến trình trainer
+
+# --- Nội dung review trong đặc trưng CBF ---
+REVIEW_TEXT_WEIGHT = 0.0          # 0 = tắt; vd. 0.3 → 30% độ tương đồng đến từ review
+REVIEW_TEXT_FULL_REBUILD = 50     # gộp lại từ đầu sau ngần này vòng (review bị sửa/xóa)
+
+_review_state = None      # ReviewTextAggregates, giữ qua các vòng
+_review_cycles = 0
+
+# --- Embedding dày cho CBF ---
+CBF_EMBEDDING_DIM = 0     # > 0 (vd. 64–128): thay feature_matrix bằng embedding truncated SVD; 0 = tắt
+
+# --- Tham số Item-Item CF ---
+ITEM_NEIGHBORS = 20       # số quán tương tự giữ lại cho mỗi quán (top-k)
+ITEM_SIM_BLOCK = 1024     # số hàng tính similarity mỗi lần (giới hạn RAM)
+
+# --- CF phân rã ma trận (variant "mf") ---
+MF_DIM = 32               # số nhân tố tiềm ẩn
+
+# Giữ trong lúc chốt trọng số nguồn + publish (vòng train vs. POST /model/weights)
+_weights_lock = threading.Lock()
 
 
 # ==========================================================
 # ⚙️ Build TF-IDF Feature Matrix (CBF)
 # ==========================================================
-def build_feature_matrix(restaurants, categories):
+def build_feature_matrix(restaurants, categories, mode=None):
+    global _hashing_state
+    mode = mode or FEATURE_MODE
     try:
         restaurants = restaurants.merge(
             categories.rename(columns={"name": "category_name"}),
@@ -33,6 +76,17 @@ def build_feature_matrix(restaurants, categories):
             restaurants["description"]
         )
 
+        if mode == "hashing":
+            # ⚙️ Hashing: chỉ vector hóa quán mới/đổi nội dung, không có từ điển.
+            # Không chuẩn hóa theo cột; IDF cố định giữa các lần làm mới
+            # (IDF_REFRESH_CYCLES) → vector quán cũ không đổi khi thêm quán.
+            if _hashing_state is None:
+                _hashing_state = HashingFeatureState()
+            changed = _hashing_state.update(restaurants["id"].tolist(),
+                                            restaurants["feature_text"].tolist())
+            print(f"🔤 [AutoTrainer] Hashing features: vector hóa lại {changed} quán.")
+            return _hashing_state.transform(restaurants["id"].tolist())
+
         # ⚙️ TF-IDF vectorization (tối ưu tiếng Việt)
         tfidf = TfidfVectorizer(ngram_range=(1, 2), min_df=1)
         feature_matrix = tfidf.fit_transform(restaurants["feature_text"])
@@ -46,82 +100,466 @@ def build_feature_matrix(restaurants, categories):
 
 
 # ==========================================================
-# ⚙️ Build User–Item Matrix (CF)
+# 💬 Đặc trưng nội dung review (gộp dần theo quán)
+# ==========================================================
+def review_text_loaders():
+    """Truy vấn review mới (id > id đã gộp) chạy chung lượt song song; {} nếu tắt."""
+    global _review_state, _review_cycles
+    if REVIEW_TEXT_WEIGHT <= 0:
+        return {}
+    if _review_state is None or _review_cycles % REVIEW_TEXT_FULL_REBUILD == 0:
+        _review_state = ReviewTextAggregates()    # đối soát: gộp lại toàn bộ
+    _review_cycles += 1
+    return {"review_texts": partial(load_review_texts, _review_state.last_review_id)}
+
+
+def add_review_features(feature_matrix, restaurants, review_texts):
+    """Cộng review mới vào tổng theo quán rồi blend vào feature_matrix."""
+    try:
+        touched = _review_state.add_reviews(review_texts)
+        print(f"💬 [AutoTrainer] {len(review_texts)} review mới → cập nhật {touched} quán.")
+        review_matrix = _review_state.matrix(restaurants["id"].tolist())
+        return blend_features(feature_matrix, review_matrix, REVIEW_TEXT_WEIGHT)
+
+    except Exception as e:
+        print(f"❌ [AutoTrainer] Lỗi build review features: {e}")
+        return None
+
+
+# ==========================================================
+# ⚙️ Build Item Embeddings (CBF dày, truncated SVD)
 # ==========================================================
-def build_user_item_matrix(all_data):
+def build_item_embeddings(item_vectors, dim=None):
+    """
+    Nén vector quán (thưa, rất nhiều chiều) thành embedding float32 dim chiều
+    bằng randomized truncated SVD, chuẩn hóa L2 theo hàng.
+    Trả về None nếu tắt (dim = 0) hoặc lỗi → CBF dùng ma trận thưa.
+    """
+    dim = CBF_EMBEDDING_DIM if dim is None else dim
+    if dim <= 0:
+        return None
     try:
-        if all_data.empty:
+        n_components = min(dim, item_vectors.shape[0] - 1, item_vectors.shape[1] - 1)
+        if n_components < 1:
             return None
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=42)
+        embeddings = svd.fit_transform(item_vectors)
+        embeddings = normalize(embeddings, norm="l2", axis=1)
+        print(f"🧩 [AutoTrainer] Item embeddings {embeddings.shape}, "
+              f"giữ {svd.explained_variance_ratio_.sum():.0%} phương sai.")
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    except Exception as e:
+        print(f"❌ [AutoTrainer] Lỗi build item_embeddings: {e}")
+        return None
 
-        user_item = all_data.pivot_table(
-            index="user_id",
-            columns="restaurant_id",
-            values="rating",
-            aggfunc="mean"
-        ).fillna(0)
-
-        # ✅ Chuẩn hóa vector mỗi user
-        user_item = pd.DataFrame(
-            normalize(user_item, norm="l2", axis=1),
-            index=user_item.index,
-            columns=user_item.columns
-        )
-        return user_item
+
+def build_item_factors(user_item, dim=MF_DIM):
+    """
+    Nhân tố quán cho CF phân rã ma trận: truncated SVD của ma trận user–item,
+    item_factors = Vᵀ (items × dim) → vector user = rating @ V (fold-in).
+    Trả về None nếu lỗi hoặc ma trận quá nhỏ.
+    """
+    try:
+        n_components = min(dim, user_item.shape[0] - 1, user_item.shape[1] - 1)
+        if n_components < 1:
+            return None
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=42)
+        svd.fit(user_item)
+        return np.ascontiguousarray(svd.components_.T, dtype=np.float32)
 
     except Exception as e:
-        print(f"❌ [AutoTrainer] Lỗi build user_item_matrix: {e}")
+        print(f"❌ [AutoTrainer] Lỗi build item_factors: {e}")
         return None
 
 
 # ==========================================================
-# 🔁 Auto update model loop
+# ⚙️ Build User–Item thưa + Item–Item Similarity (Item-based CF)
 # ==========================================================
-def auto_update(interval=60):
-    while True:
-        try:
-            print("🔄 [AutoTrainer] Đang tải dữ liệu từ MySQL...")
+def build_item_similarity(combined, k=ITEM_NEIGHBORS):
+    """
+    Từ ma trận user–item đã gộp (SourceMatrices.combine) → ma trận cho CF.
+    Cột i ứng với hàng i của `restaurants` (đã sắp theo id) → dùng chung index với CBF.
+    Trả về dict gồm:
+    - user_index: {user_id: hàng}, item_ids: mảng restaurant_id theo cột
+    - user_item_sparse: csr (users × items), giá trị = rating trung bình
+    - user_item_counts: csr cùng cấu trúc, số hành vi của mỗi cặp (cập nhật online)
+    - user_item_normalized / item_user_normalized: hàng chuẩn hóa L2 cho user-user CF
+    - item_similarity: csr (items × items), mỗi hàng giữ tối đa k láng giềng
+    - popularity: số user đã tương tác với mỗi quán
+    - popular_rank: cột sắp theo popularity giảm dần (gợi ý khi /recommend hết thời gian)
+    """
+    try:
+        if combined["all_data"].empty:
+            return None
 
-            all_data = load_all_data()
-            restaurants = load_restaurants()
-            categories = load_categories()
+        item_ids = combined["item_ids"]
+        user_item = combined["user_item_sparse"]
 
-            if all_data.empty or restaurants.empty:
-                print("⚠️ [AutoTrainer] Dữ liệu rỗng — bỏ qua vòng này.")
-                time.sleep(interval)
-                continue
+        # User-user CF: vector mỗi user độ dài 1 (precompute thay vì pivot mỗi request)
+        user_item_normalized = normalize(user_item, norm="l2", axis=1)
 
-            feature_matrix = build_feature_matrix(restaurants, categories)
-            user_item_matrix = build_user_item_matrix(all_data)
+        # Cosine giữa các cột: chuẩn hóa cột rồi nhân Rᵀ·R theo từng khối hàng
+        item_user = normalize(user_item, norm="l2", axis=0).T.tocsr()
+        n_items = len(item_ids)
+        blocks = []
+        for start in range(0, n_items, ITEM_SIM_BLOCK):
+            block = (item_user[start:start + ITEM_SIM_BLOCK] @ item_user.T).tocoo()
+            off_diag = block.row + start != block.col      # bỏ tự tương đồng
+            block = sparse.csr_matrix(
+                (block.data[off_diag], (block.row[off_diag], block.col[off_diag])),
+                shape=block.shape
+            )
+            blocks.append(_keep_top_k(block, k))
+        item_similarity = sparse.vstack(blocks).tocsr().astype(np.float32)
+        popularity = np.diff(user_item.tocsc().indptr).astype(np.int32)
 
-            model_data["all_data"] = all_data
-            model_data["restaurants"] = restaurants
-            model_data["feature_matrix"] = feature_matrix
-            model_data["user_item_matrix"] = user_item_matrix
-            model_data["last_update"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "user_index": combined["user_index"],
+            "item_ids": item_ids,
+            "user_item_sparse": user_item,
+            "user_item_counts": combined["user_item_counts"],
+            "user_item_normalized": user_item_normalized,
+            "item_user_normalized": user_item_normalized.T.tocsr(),
+            "item_similarity": item_similarity,
+            "popularity": popularity,
+            "popular_rank": np.argsort(-popularity, kind="stable"),
+        }
 
-            print(f"✅ [AutoTrainer] Model cập nhật: {len(restaurants)} quán, {len(all_data)} tương tác")
-            print(f"🕓 Lần cập nhật cuối: {model_data['last_update']}")
+    except Exception as e:
+        print(f"❌ [AutoTrainer] Lỗi build item_similarity: {e}")
+        return None
 
-        except Exception as e:
-            print(f"❌ [AutoTrainer] Lỗi cập nhật: {e}")
 
-        time.sleep(interval)
+def _keep_top_k(matrix, k):
+    """Giữ k giá trị lớn nhất trên mỗi hàng của ma trận csr."""
+    indptr, indices, data = [0], [], []
+    for i in range(matrix.shape[0]):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        row_data, row_idx = matrix.data[start:end], matrix.indices[start:end]
+        if len(row_data) > k:
+            top = np.argpartition(-row_data, k)[:k]
+            row_data, row_idx = row_data[top], row_idx[top]
+        indices.append(row_idx)
+        data.append(row_data)
+        indptr.append(indptr[-1] + len(row_data))
+    return sparse.csr_matrix(
+        (np.concatenate(data), np.concatenate(indices), indptr), shape=matrix.shape
+    )
 
 
 # ==========================================================
-# 🚀 Start AutoTrainer Thread
+# 🧪 Overlay các variant (A/B) — dựng cùng vòng, publish chung snapshot
 # ==========================================================
-def start_auto_trainer(interval=60):
-    thread = threading.Thread(target=auto_update, args=(interval,), daemon=True)
-    thread.start()
-    print(f"🚀 [AutoTrainer] Khởi động — cập nhật mỗi {interval} giây.")
+def build_overlay(name, spec, base):
+    """Chỉ trả các khóa khác model gốc `base` (dict artifact / snapshot); phần còn lại dùng chung."""
+    overlay = {"variant": name}
+
+    if "source_weights" in spec:
+        sources = base.get("interaction_sources")
+        if sources is not None:
+            weights = {**(base.get("source_weights") or DEFAULT_SOURCE_WEIGHTS),
+                       **spec["source_weights"]}
+            combined = sources.combine(weights)
+            item_cf = build_item_similarity(combined)
+            if item_cf is not None:
+                overlay.update(item_cf, all_data=combined["all_data"], source_weights=weights)
+
+    if "top_similar_users" in spec:
+        overlay["top_similar_users"] = spec["top_similar_users"]
+
+    if spec.get("cf_mode") == "mf":
+        user_item = overlay.get("user_item_sparse", base.get("user_item_sparse"))
+        factors = (build_item_factors(user_item, spec.get("mf_dim", MF_DIM))
+                   if user_item is not None else None)
+        if factors is not None:
+            overlay.update(item_factors=factors, cf_mode="mf")
+        else:
+            print(f"⚠️ [AutoTrainer] Variant {name}: không dựng được item_factors → dùng cf_mode mặc định.")
+    elif "cf_mode" in spec:
+        overlay["cf_mode"] = spec["cf_mode"]
+
+    return overlay
+
+
+def _overlay_bytes(overlay):
+    """RAM riêng của overlay (ước lượng: tổng nbytes các mảng numpy / scipy)."""
+    total = 0
+    for value in overlay.values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif hasattr(value, "data") and hasattr(value, "indices"):
+            total += value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    return total
+
+
+def build_variant_overlays(base, active=None):
+    """
+    Overlay cho các variant đang bật (variants.ACTIVE_VARIANTS) từ model gốc `base`.
+    Trả về dict variant_overlays {tên: overlay}, variant_builds {tên: build_ms, overlay_bytes}.
+    """
+    overlays, builds = {}, {}
+    for name, _ in parse_active(active or ACTIVE_VARIANTS):
+        start = time.perf_counter()
+        overlays[name] = build_overlay(name, VARIANTS[name], base)
+        builds[name] = {"build_ms": round((time.perf_counter() - start) * 1000, 1),
+                        "overlay_bytes": _overlay_bytes(overlays[name])}
+    return {"variant_overlays": overlays, "variant_builds": builds}
 
 
 # ==========================================================
-# 🔍 Test thủ công
+# 🔁 Một vòng huấn luyện
 # ==========================================================
-if __name__ == "__main__":
-    print("🧠 Đang khởi động AutoTrainer thủ công...")
-    start_auto_trainer(interval=30)
+def build_artifacts():
+    """
+    Tải dữ liệu (song song) → build ma trận.
+    Trả về dict artifact, hoặc None nếu tải/build thất bại (giữ snapshot cũ).
+    """
+    print("🔄 [AutoTrainer] Đang tải dữ liệu từ MySQL...")
+    snapshot_time = time.time()   # mốc dự phòng cho hành vi online không kèm id dòng
+    try:
+        snapshot = load_training_snapshot(extra_loaders=review_text_loaders())
+    except DataLoadError as e:
+        print(f"⚠️ [AutoTrainer] Không tải được: {e} — giữ model hiện tại.")
+        return None
+
+    # Sắp theo id → hàng của restaurants = cột user–item = hàng feature_matrix
+    restaurants = snapshot["restaurants"].sort_values("id").reset_index(drop=True)
+    categories = snapshot["categories"]
+
+    if restaurants.empty:
+        print("⚠️ [AutoTrainer] Dữ liệu rỗng — bỏ qua vòng này.")
+        return None
+
+    # Ma trận riêng từng nguồn → ma trận gộp theo trọng số hiện hành
+    sources = SourceMatrices.build(snapshot["sources"], restaurants["id"].to_numpy())
+    weights = current_weights(_trainer["artifact_dir"])
+    combined = sources.combine(weights)
+    all_data = combined.pop("all_data")
+    if all_data.empty:
+        print("⚠️ [AutoTrainer] Dữ liệu rỗng — bỏ qua vòng này.")
+        return None
+
+    feature_matrix = build_feature_matrix(restaurants, categories)
+    if feature_matrix is not None and "review_texts" in snapshot:
+        feature_matrix = add_review_features(feature_matrix, restaurants, snapshot["review_texts"])
+    item_cf = build_item_similarity({**combined, "all_data": all_data})
+
+    if feature_matrix is None or item_cf is None:
+        print("⚠️ [AutoTrainer] Build model lỗi — giữ model hiện tại.")
+        return None
+
+    # Vector quán chuẩn hóa L2 theo hàng (tính 1 lần/vòng) → CBF chỉ cần 1 tích thưa
+    item_vectors = normalize(feature_matrix, norm="l2", axis=1).astype(np.float32)
+
+    # Có embedding → CBF chỉ dùng embedding, ma trận thưa ở lại trainer (không publish)
+    item_embeddings = build_item_embeddings(item_vectors)
+    if item_embeddings is not None:
+        feature_matrix = item_vectors = None
+
+    artifacts = {
+        "all_data": all_data,
+        "restaurants": restaurants,
+        "feature_matrix": feature_matrix,
+        "item_vectors": item_vectors,
+        "item_embeddings": item_embeddings,
+        **item_cf,
+        **build_restaurant_cards(restaurants, categories),
+        "interaction_sources": sources,
+        "source_weights": weights,
+        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "snapshot_time": snapshot_time,
+        "source_marks": snapshot["marks"],
+    }
+    artifacts.update(build_variant_overlays(artifacts))
+    return artifacts
+
+
+def train_once(publish=publish_model):
+    """
+    Một vòng huấn luyện; artifact được giao cho `publish`
+    (publish_model: RAM cùng tiến trình, model_store.save_artifacts: ghi file).
+    Trả về True nếu model được cập nhật.
+    """
+    try:
+        artifacts = build_artifacts()
+        if artifacts is None:
+            return False
+
+        with _weights_lock:
+            _apply_latest_weights(artifacts)
+            version = publish(artifacts)
+        print(f"✅ [AutoTrainer] Model v{version}: {len(artifacts['restaurants'])} quán, "
+              f"{len(artifacts['all_data'])} tương tác")
+        print(f"🕓 Lần cập nhật cuối: {artifacts['last_update']}")
+        return True
+
+    except Exception as e:
+        print(f"❌ [AutoTrainer] Lỗi cập nhật: {e}")
+        return False
+
+
+def _apply_latest_weights(artifacts):
+    """Trọng số bị đổi trong lúc vòng train đang chạy → gộp lại theo trọng số mới trước khi publish."""
+    weights = current_weights(_trainer["artifact_dir"])
+    if weights == artifacts["source_weights"]:
+        return
+    combined = artifacts["interaction_sources"].combine(weights)
+    item_cf = build_item_similarity(combined)
+    if item_cf is not None:
+        artifacts.update(item_cf, all_data=combined["all_data"], source_weights=weights)
+        artifacts.update(build_variant_overlays(artifacts))
+
+
+# ==========================================================
+# 🔁 Auto update model loop
+# ==========================================================
+def apply_source_weights(weights):
+    """
+    Đổi trọng số các nguồn hành vi và dựng lại ma trận CF ngay trong RAM
+    từ interaction_sources của model đang chạy (không tải lại DB).
+    - weights: {nguồn: trọng số}, chỉ cần các nguồn muốn đổi
+    Trọng số được lưu lại → các vòng train sau (kể cả trainer tiến trình riêng) dùng tiếp.
+    Model mới giữ version (cùng snapshot), chỉ tăng revision.
+    Trả về (weights đầy đủ, (version, revision) | None nếu model chưa có dữ liệu theo nguồn).
+    """
+    weights = validate_weights(weights)
+    with _weights_lock:
+        with bind_model() as snapshot:
+            weights = set_weights(weights, _trainer["artifact_dir"])
+            sources = snapshot.get("interaction_sources")
+            if sources is None:
+                return weights, None
+
+            combined = sources.combine(weights)
+            item_cf = build_item_similarity(combined)
+            if item_cf is None:
+                return weights, None
+            # Các khóa còn lại (source_marks, restaurants, ...) giữ nguyên từ snapshot đang chạy
+            artifacts = {
+                **item_cf,
+                "all_data": combined["all_data"],
+                "source_weights": weights,
+                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            artifacts.update(build_variant_overlays({**snapshot, **artifacts}))
+            publish_model(artifacts, local=True)
+        version, revision = model_revision()
+    print(f"⚖️ [AutoTrainer] Trọng số mới {weights} → model v{version}.{revision}")
+    return weights, (version, revision)
+
+
+def auto_update(scheduler, publish=publish_model):
+    """Chờ scheduler báo tới hạn (hint / MAX_STALENESS) rồi chạy 1 vòng."""
     while True:
-        time.sleep(10)
+        scheduler.wait_until_due()
+        scheduler.cycle_started()
+        ok = train_once(publish)
+        scheduler.cycle_finished(ok)
+
+
+# ==========================================================
+# 🚀 Start AutoTrainer
+# ==========================================================
+# Chế độ chạy trainer:
+# - "thread":   thread daemon trong tiến trình Flask (mặc định, như cũ)
+# - "process":  Flask tự mở tiến trình con `python -m auto_trainer` + theo dõi artifact
+# - "external": trainer chạy riêng (systemd, cron...), Flask chỉ theo dõi artifact
+TRAINER_MODES = ("thread", "process", "external")
+
+_trainer = {"mode": None, "scheduler": None, "artifact_dir": None}
+
+
+def start_auto_trainer(mode="thread", artifact_dir=model_store.ARTIFACT_DIR,
+                       min_gap=MIN_GAP, max_staleness=MAX_STALENESS):
+    if mode not in TRAINER_MODES:
+        raise ValueError(f"mode không hợp lệ: {mode} (chọn: {', '.join(TRAINER_MODES)})")
+    _trainer.update(mode=mode, artifact_dir=artifact_dir)
+
+    if mode == "thread":
+        scheduler = RetrainScheduler(min_gap=min_gap, max_staleness=max_staleness)
+        _trainer["scheduler"] = scheduler
+        thread = threading.Thread(target=auto_update, args=(scheduler,), daemon=True)
+        thread.start()
+        print(f"🚀 [AutoTrainer] Khởi động — train theo hint, tối đa {max_staleness} giây/lần.")
+        return
+
+    if mode == "process":
+        child = subprocess.Popen([
+            sys.executable, "-m", "auto_trainer",
+            "--artifact-dir", artifact_dir,
+            "--min-gap", str(min_gap),
+            "--max-staleness", str(max_staleness),
+            "--parent-pid", str(os.getpid()),
+        ], cwd=os.path.dirname(os.path.abspath(__file__)))
+        atexit.register(child.terminate)
+        print(f"🚀 [AutoTrainer] Tiến trình con pid={child.pid}")
+
+    model_store.start_artifact_watcher(artifact_dir)
+
+
+def request_refresh(source="unknown"):
+    """
+    Báo có dữ liệu mới (gọi từ Flask khi Laravel gửi hint).
+    Thread mode: báo thẳng scheduler; process/external: cập nhật file hint.
+    """
+    if _trainer["scheduler"] is not None:
+        _trainer["scheduler"].hint(source)
+    elif _trainer["artifact_dir"]:
+        touch_hint_file(_trainer["artifact_dir"])
+    else:
+        return False
+    return True
+
+
+def trainer_status():
+    scheduler = _trainer["scheduler"]
+    return {
+        "mode": _trainer["mode"],
+        "scheduler": scheduler.status() if scheduler is not None else None,
+    }
+
+
+def _exit_when_parent_dies(pid):
+    # POSIX: tiến trình con bị chuyển sang cha khác khi Flask chết.
+    # Windows không có cơ chế này — dựa vào atexit phía Flask.
+    if os.name != "posix":
+        return
+    while os.getppid() == pid:
+        time.sleep(2)
+    print("👋 [AutoTrainer] Flask đã dừng — thoát trainer.")
+    os._exit(0)
+
+
+def run_standalone(artifact_dir, min_gap=MIN_GAP, max_staleness=MAX_STALENESS,
+                   parent_pid=None, once=False):
+    """Vòng lặp trainer độc lập: ghi artifact ra artifact_dir cho Flask nạp."""
+    _trainer["artifact_dir"] = artifact_dir     # đọc trọng số nguồn do Flask ghi
+    publish = partial(model_store.save_artifacts, directory=artifact_dir)
+    if once:
+        return train_once(publish)
+
+    if parent_pid:
+        threading.Thread(target=_exit_when_parent_dies, args=(parent_pid,), daemon=True).start()
+    scheduler = RetrainScheduler(min_gap=min_gap, max_staleness=max_staleness,
+                                 hint_dir=artifact_dir)
+    auto_update(scheduler, publish)
+
+
+# ==========================================================
+# 🖥️ Chạy độc lập: python -m auto_trainer [--min-gap 10] [--once]
+# ==========================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AutoTrainer — huấn luyện ngoài tiến trình Flask")
+    parser.add_argument("--artifact-dir", default=model_store.ARTIFACT_DIR)
+    parser.add_argument("--min-gap", type=float, default=MIN_GAP,
+                        help="số giây tối thiểu giữa 2 vòng huấn luyện")
+    parser.add_argument("--max-staleness", type=float, default=MAX_STALENESS,
+                        help="không có hint vẫn train lại sau ngần này giây")
+    parser.add_argument("--parent-pid", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--once", action="store_true", help="chỉ chạy 1 vòng rồi thoát")
+    args = parser.parse_args()
+
+    print(f"🧠 [AutoTrainer] Chạy độc lập → {args.artifact_dir}")
+    run_standalone(args.artifact_dir, args.min_gap, args.max_staleness,
+                   args.parent_pid, args.once)
@@ -0,0 +1,190 @@
+# ==========================================================
+# cards.py — Thẻ quán ăn serialize sẵn + định dạng response gọn
+# ----------------------------------------------------------
+# Laravel trước đây nhận id từ /recommend rồi query lại DB (whereIn) để lấy
+# tên / địa chỉ / ảnh. Thẻ quán được dựng & serialize 1 lần mỗi version model
+# (trong trainer) → /recommend?include=card chỉ việc ghép chuỗi có sẵn.
+# ==========================================================
+
+import json
+
+import numpy as np
+
+try:
+    import msgpack      # tùy chọn: format=msgpack
+except ImportError:
+    msgpack = None
+
+# Các trường trong thẻ (Laravel hiển thị trực tiếp, không cần query DB)
+CARD_FIELDS = ("id", "name", "address", "image_url", "latitude", "longitude",
+               "category_id", "category_name")
+RESPONSE_FORMATS = ("json", "compact", "msgpack")
+INCLUDE_OPTIONS = ("card",)
+SCORE_DECIMALS = 4
+
+MSGPACK_MIMETYPE = "application/x-msgpack"
+
+
+def _plain(value):
+    """NaN/None → None; Decimal (latitude) / numpy → kiểu JSON thuần."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, str):
+        return value
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return None if np.isnan(value) else value
+
+
+# ==========================================================
+# 🃏 Dựng thẻ quán (trainer, 1 lần / version)
+# ==========================================================
+def build_restaurant_cards(restaurants, categories):
+    """
+    Thẻ của từng quán theo đúng thứ tự hàng của `restaurants` (= item_ids).
+    Trả về {"card_json": [str], "card_msgpack": [bytes] | None}.
+    """
+    names = dict(zip(categories["id"], categories["name"])) if not categories.empty else {}
+    frame = restaurants.reindex(columns=[f for f in CARD_FIELDS if f != "category_name"])
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    card_json, card_msgpack = [], [] if msgpack is not None else None
+    for row in frame.itertuples(index=False):
+        card = {field: _plain(value) for field, value in zip(frame.columns, row)}
+        card["category_name"] = names.get(card["category_id"])
+        card_json.append(json.dumps(card, ensure_ascii=False, separators=(",", ":")))
+        if card_msgpack is not None:
+            card_msgpack.append(msgpack.packb(card, use_bin_type=True))
+    return {"card_json": card_json, "card_msgpack": card_msgpack}
+
+
+def card_rows(ids, item_ids):
+    """restaurant_id → hàng thẻ (item_ids đã sắp tăng); -1 nếu không có."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if item_ids is None or len(item_ids) == 0:
+        return np.full(len(ids), -1)
+    rows = np.searchsorted(item_ids, ids).clip(max=len(item_ids) - 1)
+    return np.where(item_ids[rows] == ids, rows, -1)
+
+
+# ==========================================================
+# 📤 Response /recommend
+# ==========================================================
+def render_recommendations(user_id, recs, model, include=(), fmt="json", meta=None):
+    """
+    recs: DataFrame (id, name, score). Trả về (body, mimetype).
+    - json:    {"user_id", "recommendations": [{id, name, score[, card]}], ...meta}
+    - compact: {"user_id", "version", "ids", "scores"[, "cards"], ...meta} — bỏ tên, score làm tròn
+    - msgpack: như compact, mã hóa msgpack
+    Thẻ được chèn nguyên chuỗi/bytes đã serialize sẵn, không dựng lại dict.
+    """
+    meta = meta or {}
+    ids = recs["id"].to_numpy(dtype=np.int64)
+    scores = recs["score"].to_numpy(dtype=float)
+    scores = (scores if fmt == "json" else np.round(scores, SCORE_DECIMALS)).tolist()
+    want_card = "card" in include
+
+    if want_card:
+        rows = card_rows(ids, model.get("item_ids")).tolist()
+        store = model.get("card_msgpack" if fmt == "msgpack" else "card_json")
+        if store is None:
+            rows = [-1] * len(rows)
+
+    if fmt == "msgpack":
+        packer = msgpack.Packer(use_bin_type=True)
+        head = {"user_id": user_id, "version": model.get("version"),
+                "ids": ids.tolist(), "scores": scores, **meta}
+        fields = [(key, packer.pack(value)) for key, value in head.items()]
+        if want_card:
+            none = packer.pack(None)
+            fields.append(("cards", _msgpack_array(packer, [store[r] if r >= 0 else none
+                                                             for r in rows])))
+        return _msgpack_map(packer, fields), MSGPACK_MIMETYPE
+
+    if fmt == "compact":
+        head = {"user_id": user_id, "version": model.get("version"),
+                "ids": ids.tolist(), "scores": scores, **meta}
+        fields = [(key, _dumps(value)) for key, value in head.items()]
+        if want_card:
+            fields.append(("cards", _json_array([store[r] if r >= 0 else "null" for r in rows])))
+        return _json_object(fields), "application/json"
+
+    items = []
+    for i, (rid, name, score) in enumerate(zip(ids.tolist(), recs["name"].tolist(), scores)):
+        item = [("id", _dumps(rid)), ("name", _dumps(_plain(name))), ("score", _dumps(score))]
+        if want_card:
+            item.append(("card", store[rows[i]] if rows[i] >= 0 else "null"))
+        items.append(_json_object(item))
+    head = {"user_id": user_id, **meta}
+    fields = [(key, _dumps(value)) for key, value in head.items()]
+    fields.append(("recommendations", _json_array(items)))
+    return _json_object(fields), "application/json"
+
+
+# ==========================================================
+# 🧩 Ghép envelope quanh các đoạn đã mã hóa sẵn
+# ----------------------------------------------------------
+# fields: [(khóa, giá trị ĐÃ mã hóa)] — khóa luôn qua encoder thật, giá trị là
+# kết quả json.dumps / msgpack.pack hoặc thẻ serialize sẵn → envelope luôn hợp lệ
+# dù thêm/bớt khóa meta.
+# ==========================================================
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _json_object(fields):
+    return "{" + ",".join(f"{_dumps(key)}:{value}" for key, value in fields) + "}"
+
+
+def _json_array(fragments):
+    return "[" + ",".join(fragments) + "]"
+
+
+def _msgpack_map(packer, fields):
+    return packer.pack_map_header(len(fields)) + b"".join(
+        packer.pack(key) + value for key, value in fields)
+
+
+def _msgpack_array(packer, fragments):
+    return packer.pack_array_header(len(fragments)) + b"".join(fragments)
+
+
+# ==========================================================
+# ✅ Kiểm tra nhanh: envelope ghép tay == encoder thật
+# ==========================================================
+if __name__ == "__main__":
+    import pandas as pd
+
+    restaurants = pd.DataFrame({"id": [1, 2, 3], "name": ["Phở \"Hà\" Nội", "Bún chả", None],
+                                "address": ["1 Lê Lợi", None, "3 Trần Phú"], "category_id": [1, 2, 9]})
+    categories = pd.DataFrame({"id": [1, 2], "name": ["Phở", "Bún"]})
+    model = {"item_ids": np.array([1, 2, 3]), "version": 7,
+             **build_restaurant_cards(restaurants, categories)}
+    recs = pd.DataFrame({"id": [3, 1, 42], "name": [None, "Phở", "Quán mới"],
+                         "score": [0.9, 0.51234567, 0.1]})
+    meta = {"mode": "hybrid", "degraded": None, "next_cursor": "abc"}
+    cards = [json.loads(model["card_json"][2]), json.loads(model["card_json"][0]), None]
+
+    for meta_case in ({}, meta):
+        body, _ = render_recommendations(5, recs, model, include=("card",), fmt="json", meta=meta_case)
+        decoded = json.loads(body)
+        assert decoded == {"user_id": 5, **meta_case, "recommendations": [
+            {"id": rid, "name": name, "score": score, "card": card}
+            for rid, name, score, card in zip([3, 1, 42], [None, "Phở", "Quán mới"],
+                                              [0.9, 0.51234567, 0.1], cards)]}
+
+        body, _ = render_recommendations(5, recs, model, include=("card",), fmt="compact", meta=meta_case)
+        expected = {"user_id": 5, "version": 7, "ids": [3, 1, 42],
+                    "scores": [0.9, 0.5123, 0.1], **meta_case, "cards": cards}
+        assert json.loads(body) == expected
+
+        if msgpack is not None:
+            body, _ = render_recommendations(5, recs, model, include=("card",), fmt="msgpack",
+                                             meta=meta_case)
+            assert msgpack.unpackb(body) == expected
+
+    print("✅ cards.py: envelope json / compact / msgpack hợp lệ")
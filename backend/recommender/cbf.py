@@ -7,8 +7,22 @@
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import linalg as sparse_linalg
 from model_state import model_data
+from online_update import get_user_row, get_cbf_profile
+from utils import top_k_indices
+
+
+def score_items(user_profile, item_vectors):
+    """
+    Cosine giữa hồ sơ user (1×F thưa) và mọi quán.
+    item_vectors đã chuẩn hóa L2 theo hàng → chỉ còn 1 tích thưa rồi chia |profile|,
+    chi phí tỉ lệ với số phần tử khác 0, không phải features × items.
+    """
+    norm = sparse_linalg.norm(user_profile)
+    if norm == 0:
+        return np.zeros(item_vectors.shape[0])
+    return (item_vectors @ user_profile.T).toarray().ravel() / norm
 
 
 def recommend_cbf(user_id, top_n=5, exclude_seen=True):
@@ -18,53 +32,48 @@ def recommend_cbf(user_id, top_n=5, exclude_seen=True):
     """
     # ✅ Lấy dữ liệu đã được auto_trainer cập nhật
     restaurants = model_data.get("restaurants", pd.DataFrame())
-    all_data = model_data.get("all_data", pd.DataFrame())
-    feature_matrix = model_data.get("feature_matrix", None)
+    item_vectors = model_data.get("item_vectors", None)
+    item_embeddings = model_data.get("item_embeddings")
+    popularity = model_data.get("popularity", None)
 
-    # Kiểm tra model đã sẵn sàng chưa
-    if restaurants.empty or all_data.empty or feature_matrix is None:
+    # Kiểm tra model đã sẵn sàng chưa (vector thưa hoặc embedding, tùy CBF_EMBEDDING_DIM)
+    if restaurants.empty or (item_vectors is None and item_embeddings is None) or popularity is None:
         print("⚠️ [CBF] Model chưa sẵn sàng hoặc dữ liệu rỗng.")
         return pd.DataFrame(columns=["id", "name", "score"])
 
-    # Lấy các quán user từng tương tác
-    user_items = all_data[all_data["user_id"] == user_id]
-
-    # Cold-start: user chưa từng có hành vi nào
-    if user_items.empty:
-        top_restaurants = (
-            all_data.groupby("restaurant_id").size()
-            .sort_values(ascending=False)
-            .head(top_n).index
-        )
-        recs = restaurants[restaurants["id"].isin(top_restaurants)][["id", "name"]].copy()
+    # Các quán user từng tương tác (index hàng trong restaurants / feature_matrix)
+    row = get_user_row(user_id)
+
+    # Cold-start: user chưa từng có hành vi nào → quán nhiều người tương tác nhất
+    if row is None:
+        top_idx = top_k_indices(popularity, min(top_n, int((popularity > 0).sum())))
+        recs = restaurants.iloc[np.sort(top_idx)][["id", "name"]].copy()
         recs["score"] = 1.0
         return recs
 
-    # Lấy index quán đã tương tác
-    user_idx = restaurants[restaurants["id"].isin(user_items["restaurant_id"])].index
-
-    # Vector rating tương ứng (mặc định = 1 nếu thiếu)
-    ratings = (
-        user_items.set_index("restaurant_id")
-        .reindex(restaurants.loc[user_idx, "id"])
-        ["rating"].fillna(1)
-        .values.reshape(-1, 1)
-    )
+    user_idx, ratings = row[0], row[1]
 
-    # Hồ sơ người dùng = trung bình có trọng số của các vector đặc trưng quán
-    weighted_sum = feature_matrix[user_idx].T @ ratings
-    denom = ratings.sum() if ratings.sum() != 0 else 1.0
-    user_profile = (weighted_sum / denom).T  # (1, n_features)
+    if item_embeddings is not None:
+        # Embedding dày: hồ sơ = trung bình có trọng số embedding quán (dim nhỏ),
+        # chấm điểm bằng 1 phép nhân ma trận dày × vector
+        user_profile = ratings @ item_embeddings[user_idx]
+        norm = np.linalg.norm(user_profile)
+        sim = item_embeddings @ (user_profile / norm) if norm > 0 else np.zeros(len(item_embeddings))
+    else:
+        # Hồ sơ người dùng = trung bình có trọng số của các vector đặc trưng quán
+        # (cache theo user, cập nhật online khi có hành vi mới)
+        user_profile = get_cbf_profile(user_id)  # (1, n_features)
 
-    # Tính độ tương đồng cosine giữa hồ sơ user và tất cả quán
-    sim = cosine_similarity(user_profile, feature_matrix).flatten()
+        # Tính độ tương đồng cosine giữa hồ sơ user và tất cả quán
+        sim = score_items(user_profile, item_vectors)
 
     # Loại bỏ quán đã tương tác để tránh trùng
     if exclude_seen:
         sim[user_idx] = -1e9
+        top_n = min(top_n, len(sim) - len(user_idx))   # danh sách dài không lẫn quán đã xem
 
-    # Chọn Top N
-    top_idx = sim.argsort()[::-1][:top_n]
+    # Chọn Top N (argpartition, không sort toàn bộ)
+    top_idx = top_k_indices(sim, top_n)
     recs = restaurants.iloc[top_idx][["id", "name"]].copy()
     recs["score"] = sim[top_idx]
     return recs
@@ -78,7 +87,7 @@ if __name__ == "__main__":
     import time
 
     print("🚀 Khởi động AutoTrainer (test mode)...")
-    start_auto_trainer(interval=30)
+    start_auto_trainer()
     time.sleep(5)
 
     user_test = 4
@@ -7,51 +7,12 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import normalize
 from model_state import model_data
+from online_update import get_user_row
+from utils import top_k_indices
 
 # --- Tham số cấu hình ---
-TOP_SIMILAR_USERS = 5
-
-
-# ==========================================================
-def build_user_item_matrix():
-    """Tạo ma trận user–item (người dùng – quán ăn) từ model_state."""
-    data = model_data.get("all_data", pd.DataFrame())
-
-    if data.empty:
-        print("⚠️ [CF] all_data rỗng — chưa có dữ liệu trong model_state.")
-        return pd.DataFrame()
-
-    # 🧱 Pivot table user–item matrix
-    user_item_matrix = data.pivot_table(
-        index="user_id",
-        columns="restaurant_id",
-        values="rating",
-        aggfunc="mean"
-    ).fillna(0)
-
-    # ✅ Chuẩn hóa theo hàng (mỗi user có vector độ dài 1)
-    if not user_item_matrix.empty:
-        user_item_matrix = pd.DataFrame(
-            normalize(user_item_matrix, norm="l2", axis=1),
-            index=user_item_matrix.index,
-            columns=user_item_matrix.columns
-        )
-    else:
-        print("⚠️ [CF] user_item_matrix trống.")
-    return user_item_matrix
-
-
-# ==========================================================
-def calculate_similarity(user_item_matrix):
-    """Tính độ tương đồng giữa các user (cosine similarity)."""
-    if user_item_matrix.empty or len(user_item_matrix) < 2:
-        return pd.DataFrame(1.0, index=user_item_matrix.index, columns=user_item_matrix.index)
-
-    sim = cosine_similarity(user_item_matrix)
-    return pd.DataFrame(sim, index=user_item_matrix.index, columns=user_item_matrix.index)
+TOP_SIMILAR_USERS = 5      # variant có thể đè bằng model_data["top_similar_users"]
 
 
 # ==========================================================
@@ -59,46 +20,125 @@ def recommend_for_user(user_id, top_n=5, exclude_user_rated=True):
     """
     Gợi ý dựa trên cộng tác (Collaborative Filtering).
     - exclude_user_rated: loại bỏ quán user đã tương tác.
+    Ma trận user–item đã chuẩn hóa được auto_trainer tính sẵn; hàng của user
+    lấy bản online (online_update) nên hành vi mới có hiệu lực ngay.
     """
     restaurants = model_data.get("restaurants", pd.DataFrame())
-    user_item_matrix = build_user_item_matrix()
+    user_item = model_data.get("user_item_normalized")
+    item_user = model_data.get("item_user_normalized")
+    row = get_user_row(user_id)
 
-    if user_item_matrix.empty or user_id not in user_item_matrix.index:
+    if user_item is None or row is None:
         print(f"⚠️ [CF] User {user_id} chưa có dữ liệu hoặc matrix rỗng.")
         return fallback_recommendations(top_n, restaurants)
 
-    similarity_df = calculate_similarity(user_item_matrix)
-    similar_users = similarity_df[user_id].drop(user_id).sort_values(ascending=False)
+    # Cosine với mọi user = tích vô hướng (các hàng đã chuẩn hóa L2)
+    seen, ratings = row[0], row[1]
+    user_vector = ratings / (np.linalg.norm(ratings) or 1.0)
+    similarity = np.asarray(item_user[seen].T @ user_vector).ravel()
+    own_row = model_data["user_index"].get(user_id)
+    if own_row is not None:
+        similarity[own_row] = -np.inf
 
-    if similar_users.empty:
+    n_others = len(similarity) - (own_row is not None)
+    if n_others <= 0:
         print(f"⚠️ [CF] Không tìm thấy user tương tự cho user {user_id}.")
         return fallback_recommendations(top_n, restaurants)
 
-    top_sim_users = similar_users.head(max(TOP_SIMILAR_USERS, 1))
-    user_rated_restaurants = set(user_item_matrix.loc[user_id][user_item_matrix.loc[user_id] > 0].index)
+    k = min(max(model_data.get("top_similar_users", TOP_SIMILAR_USERS), 1), n_others)
+    top_users = np.argpartition(-similarity, k - 1)[:k]
+    top_users = top_users[similarity[top_users] > 0]
 
     # 🔹 Tính điểm gợi ý weighted average
-    recommendations = {}
-    sim_sum = {}
-
-    for sim_user_id, sim_score in top_sim_users.items():
-        for rid, rating in user_item_matrix.loc[sim_user_id].items():
-            if rating > 0:
-                if exclude_user_rated and rid in user_rated_restaurants:
-                    continue
-                recommendations[rid] = recommendations.get(rid, 0.0) + rating * sim_score
-                sim_sum[rid] = sim_sum.get(rid, 0.0) + sim_score
-
-    if not recommendations:
+    neighbors = user_item[top_users]
+    sim_scores = similarity[top_users]
+    weighted = np.asarray(neighbors.T @ sim_scores).ravel()
+    sim_sum = np.asarray((neighbors > 0).T @ sim_scores).ravel()
+    if exclude_user_rated:
+        sim_sum[seen] = 0.0
+
+    candidates = np.flatnonzero(sim_sum > 0)
+    if candidates.size == 0:
         print(f"⚠️ [CF] Không có quán mới để gợi ý cho user {user_id}.")
+        return pd.DataFrame(columns=["id", "score", "name"])
+
+    scores = weighted[candidates] / sim_sum[candidates]
+    order = np.argsort(-scores)[:top_n]
+    recs_df = pd.DataFrame({
+        "id": model_data["item_ids"][candidates[order]],
+        "score": scores[order],
+    })
+    return recs_df.merge(restaurants[["id", "name"]], on="id", how="left")
+
+
+# ==========================================================
+def recommend_item_based(user_id, top_n=5, exclude_user_rated=True):
+    """
+    Gợi ý Item-based CF: chấm điểm quán theo các quán user đã tương tác.
+    Ma trận tương đồng top-k được auto_trainer tính sẵn → mỗi request chỉ gom
+    các hàng tương ứng (1 phép nhân thưa), không tính lại similarity.
+    """
+    restaurants = model_data.get("restaurants", pd.DataFrame())
+    item_similarity = model_data.get("item_similarity")
+    row = get_user_row(user_id)
+
+    if item_similarity is None or row is None:
+        print(f"⚠️ [CF-item] User {user_id} chưa có dữ liệu hoặc model chưa sẵn sàng.")
         return fallback_recommendations(top_n, restaurants)
 
-    scores = {rid: recommendations[rid] / sim_sum[rid] for rid in recommendations if sim_sum[rid] > 0}
-    recs_df = pd.DataFrame(scores.items(), columns=["id", "score"])
-    recs_df = recs_df.merge(restaurants[["id", "name"]], on="id", how="left")
-    recs_df = recs_df.sort_values("score", ascending=False).head(top_n)
+    seen, ratings = row[0], row[1]
+
+    # score_j = Σ r_i·s_ij (tổng có trọng số theo độ tương đồng). Không chia cho Σ s_ij:
+    # trung bình làm mọi quán hòa nhau khi user chấm mọi quán cùng 1 mức
+    neighbors = item_similarity[seen]
+    scores = np.asarray(neighbors.T @ ratings).ravel()
+    if exclude_user_rated:
+        scores[seen] = 0.0
+
+    candidates = np.flatnonzero(scores > 0)
+    if candidates.size == 0:
+        print(f"⚠️ [CF-item] Không có quán mới để gợi ý cho user {user_id}.")
+        return fallback_recommendations(top_n, restaurants)
+
+    if candidates.size > top_n:
+        candidates = candidates[np.argpartition(-scores[candidates], top_n)[:top_n]]
+    candidates = candidates[np.argsort(-scores[candidates])]
+
+    recs_df = pd.DataFrame({
+        "id": model_data["item_ids"][candidates],
+        "score": scores[candidates],
+    })
+    return recs_df.merge(restaurants[["id", "name"]], on="id", how="left")
+
 
-    return recs_df
+# ==========================================================
+def recommend_matrix_factorization(user_id, top_n=5, exclude_user_rated=True):
+    """
+    Gợi ý bằng phân rã ma trận (truncated SVD, auto_trainer.build_item_factors).
+    Vector user = fold-in hàng rating vào không gian nhân tố (rating @ V) → dùng được
+    cả hàng online; điểm = tái tạo hàng user (V · vector user).
+    """
+    restaurants = model_data.get("restaurants", pd.DataFrame())
+    item_factors = model_data.get("item_factors")
+    row = get_user_row(user_id)
+
+    if item_factors is None or row is None:
+        print(f"⚠️ [MF] User {user_id} chưa có dữ liệu hoặc chưa có item_factors.")
+        return pd.DataFrame(columns=["id", "score", "name"])
+
+    seen, ratings = row[0], row[1]
+    user_vector = ratings @ item_factors[seen]
+    scores = item_factors @ user_vector
+    if exclude_user_rated:
+        scores[seen] = -np.inf
+
+    n_candidates = int(np.isfinite(scores).sum())
+    top = top_k_indices(scores, min(top_n, n_candidates))
+    recs_df = pd.DataFrame({
+        "id": model_data["item_ids"][top],
+        "score": scores[top],
+    })
+    return recs_df.merge(restaurants[["id", "name"]], on="id", how="left")
 
 
 # ==========================================================
@@ -122,7 +162,7 @@ if __name__ == "__main__":
     import time
 
     print("🚀 Khởi động AutoTrainer (test mode)...")
-    start_auto_trainer(interval=30)
+    start_auto_trainer()
     time.sleep(5)
 
     user_test = 4
@@ -5,6 +5,12 @@
 # Sử dụng bởi auto_trainer.py để huấn luyện CF + CBF
 # ==========================================================
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import partial
+
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
 
@@ -15,35 +21,108 @@ DB_HOST = "127.0.0.1"
 DB_PORT = "3306"
 DB_NAME = "foodreview"
 
+# --- Cấu hình tải song song ---
+LOAD_WORKERS = 6       # số truy vấn chạy đồng thời (= số kết nối trong pool)
+QUERY_TIMEOUT = 30     # giây — thời gian tối đa cho mỗi truy vấn
+
+# --- Cấu hình streaming (đọc theo chunk) ---
+STREAMING_INGEST = False   # True: đọc từng chunk + gộp dần, RAM không phụ thuộc tổng số dòng
+CHUNK_SIZE = 50_000        # số dòng mỗi chunk
+
+# Rating quy đổi cho từng loại hành vi (khớp với hằng số trong SQL bên dưới)
+BEHAVIOR_RATINGS = {"favorite": 5, "like": 2, "comment": 1}
+
+# Trọng số mặc định khi gộp các nguồn (giữ đúng kết quả cũ):
+# - reviews: hệ số nhân số sao
+# - favorites / likes / comments: rating quy đổi cho mỗi hành vi
+# Nguồn có trọng số 0 bị bỏ hẳn (không tính vào mẫu số trung bình).
+REVIEW_SOURCE = "reviews"
+DEFAULT_SOURCE_WEIGHTS = {
+    REVIEW_SOURCE: 1.0,
+    **{f"{kind}s": float(rating) for kind, rating in BEHAVIOR_RATINGS.items()},
+}
+
+# Truy vấn hành vi (3 cột cần cho huấn luyện + id dòng để đánh dấu mốc snapshot)
+INTERACTION_SQL = {
+    "reviews": "SELECT id, user_id, restaurant_id, rating FROM reviews",
+    "favorites": "SELECT id, user_id, restaurant_id, 5 AS rating FROM favorites",
+    "likes": """
+        SELECT l.id, l.user_id, r.restaurant_id, 2 AS rating
+        FROM likes l
+        JOIN reviews r ON l.review_id = r.id
+    """,
+    "comments": """
+        SELECT c.id, c.user_id, r.restaurant_id, 1 AS rating
+        FROM comments c
+        JOIN reviews r ON c.review_id = r.id
+    """,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+class DataLoadError(Exception):
+    """Một hoặc nhiều bảng không tải được (lỗi hoặc quá thời gian)."""
+
+    def __init__(self, failures):
+        self.failures = failures   # {tên bảng: lỗi}
+        super().__init__(", ".join(f"{name}: {err}" for name, err in failures.items()))
+
 
 # ==========================================================
 # 🧠 Hàm tạo engine kết nối
 # ==========================================================
 def get_engine():
-    """Tạo kết nối MySQL qua SQLAlchemy."""
-    url = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    return create_engine(
-        url,
-        pool_pre_ping=True,   # kiểm tra kết nối trước khi dùng
-        pool_recycle=3600,    # reset kết nối sau 1h tránh timeout
-        echo=False
-    )
+    """Trả về engine MySQL dùng chung (pool kết nối được tái sử dụng giữa các lần load)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+                _engine = create_engine(
+                    url,
+                    pool_size=LOAD_WORKERS,   # đủ kết nối cho các truy vấn song song
+                    max_overflow=2,
+                    pool_pre_ping=True,   # kiểm tra kết nối trước khi dùng
+                    pool_recycle=3600,    # reset kết nối sau 1h tránh timeout
+                    connect_args={
+                        # pymysql ngắt truy vấn treo quá QUERY_TIMEOUT giây
+                        "read_timeout": QUERY_TIMEOUT,
+                        "write_timeout": QUERY_TIMEOUT,
+                    },
+                    echo=False
+                )
+    return _engine
 
 
 # ==========================================================
 # 1️⃣ Load từng bảng gốc
 # ==========================================================
 def load_reviews():
-    """Bảng reviews (user_id, restaurant_id, rating, content)."""
-    query = "SELECT user_id, restaurant_id, rating, content FROM reviews"
+    """Bảng reviews (id, user_id, restaurant_id, rating, content)."""
+    query = "SELECT id, user_id, restaurant_id, rating, content FROM reviews"
     with get_engine().connect() as conn:
         df = pd.read_sql(text(query), conn)
     return df
 
 
+def load_review_texts(after_id=0):
+    """Nội dung review (id, restaurant_id, content) có id > after_id — để gộp dần."""
+    query = """
+        SELECT id, restaurant_id, content
+        FROM reviews
+        WHERE id > :after_id
+        ORDER BY id
+    """
+    with get_engine().connect() as conn:
+        df = pd.read_sql(text(query), conn, params={"after_id": int(after_id)})
+    return df
+
+
 def load_favorites():
     """Bảng favorites, quy đổi thành rating = 5."""
-    query = "SELECT user_id, restaurant_id, 5 AS rating FROM favorites"
+    query = INTERACTION_SQL["favorites"]
     with get_engine().connect() as conn:
         df = pd.read_sql(text(query), conn)
     return df
@@ -51,11 +130,7 @@ def load_favorites():
 
 def load_likes():
     """Bảng likes (user_id, review_id) -> rating = 2."""
-    query = """
-        SELECT l.user_id, r.restaurant_id, 2 AS rating
-        FROM likes l
-        JOIN reviews r ON l.review_id = r.id
-    """
+    query = INTERACTION_SQL["likes"]
     with get_engine().connect() as conn:
         df = pd.read_sql(text(query), conn)
     return df
@@ -63,20 +138,16 @@ def load_likes():
 
 def load_comments():
     """Bảng comments (user_id, review_id) -> rating = 1."""
-    query = """
-        SELECT c.user_id, r.restaurant_id, 1 AS rating
-        FROM comments c
-        JOIN reviews r ON c.review_id = r.id
-    """
+    query = INTERACTION_SQL["comments"]
     with get_engine().connect() as conn:
         df = pd.read_sql(text(query), conn)
     return df
 
 
 def load_restaurants():
-    """Bảng restaurants (id, name, address, category_id, description...)."""
+    """Bảng restaurants (id, name, address, category_id, description, image_url...)."""
     query = """
-        SELECT id, name, address, latitude, longitude, category_id, description
+        SELECT id, name, address, latitude, longitude, category_id, description, image_url
         FROM restaurants
     """
     with get_engine().connect() as conn:
@@ -101,35 +172,282 @@ def load_users():
 
 
 # ==========================================================
-# 2️⃣ Gộp dữ liệu cho huấn luyện CF + CBF
+# 2️⃣ Tải song song nhiều bảng
 # ==========================================================
-def load_all_data():
+INTERACTION_LOADERS = {
+    "reviews": load_reviews,
+    "favorites": load_favorites,
+    "likes": load_likes,
+    "comments": load_comments,
+}
+
+CATALOG_LOADERS = {
+    "restaurants": load_restaurants,
+    "categories": load_categories,
+}
+
+
+def load_tables_parallel(loaders, timeout=QUERY_TIMEOUT):
     """
-    Gộp tất cả hành vi (reviews + favorites + likes + comments)
-    thành 1 DataFrame duy nhất: user_id, restaurant_id, rating
+    Chạy đồng thời các hàm load_* (dict tên -> hàm) trên pool kết nối dùng chung.
+    - Mỗi truy vấn có tối đa `timeout` giây.
+    - Nếu có bảng lỗi hoặc quá hạn → raise DataLoadError (không trả DataFrame rỗng).
     """
+    tables, failures = {}, {}
+    executor = ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(loaders)))
     try:
-        reviews = load_reviews()[["user_id", "restaurant_id", "rating"]]
-        favorites = load_favorites()[["user_id", "restaurant_id", "rating"]]
-        likes = load_likes()[["user_id", "restaurant_id", "rating"]]
-        comments = load_comments()[["user_id", "restaurant_id", "rating"]]
-
-        # Gộp tất cả hành vi
-        all_data = pd.concat(
-            [reviews, favorites, likes, comments],
-            ignore_index=True
-        )
-
-        # Gom nhóm lấy trung bình nếu user có nhiều hành vi trên cùng quán
-        all_data = (
-            all_data.groupby(["user_id", "restaurant_id"])
-            .rating.mean()
-            .reset_index()
-        )
-
-        print(f"✅ Load dữ liệu huấn luyện thành công: {len(all_data)} bản ghi.")
-        return all_data
-
-    except Exception as e:
-        print(f"❌ [data_loader] Lỗi khi load dữ liệu: {e}")
-        return pd.DataFrame(columns=["user_id", "restaurant_id", "rating"])
+        futures = {name: executor.submit(fn) for name, fn in loaders.items()}
+        deadline = time.monotonic() + timeout
+        for name, future in futures.items():
+            try:
+                tables[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                failures[name] = f"quá {timeout}s"
+            except Exception as e:
+                failures[name] = e
+    finally:
+        # Không chờ truy vấn treo — read_timeout của pymysql sẽ tự ngắt
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if failures:
+        raise DataLoadError(failures)
+    return tables
+
+
+# ==========================================================
+# 3️⃣ Streaming: đọc theo chunk, gộp dần theo cặp (user, quán)
+# ==========================================================
+class PairAccumulator:
+    """
+    Gộp dần tổng rating + số lần theo cặp (user_id, restaurant_id).
+    Key = user_id << 32 | restaurant_id, giữ sắp xếp trong mảng numpy cấp phát trước
+    (tăng gấp đôi khi đầy). RAM tỉ lệ với số cặp duy nhất, không phụ thuộc số dòng đọc.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.last_id = 0      # id dòng lớn nhất đã đọc (stream_interactions ghi) — mốc snapshot
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        # 2 bộ đệm: ghi kết quả merge sang bộ còn lại rồi đổi chỗ
+        self.keys, self._keys_b = np.empty(capacity, np.int64), np.empty(capacity, np.int64)
+        self.sums, self._sums_b = np.empty(capacity, np.float32), np.empty(capacity, np.float32)
+        self.counts, self._counts_b = np.empty(capacity, np.int32), np.empty(capacity, np.int32)
+
+    def _reserve(self, needed):
+        if needed <= len(self.keys):
+            return
+        n = self.size
+        keys, sums, counts = self.keys[:n], self.sums[:n], self.counts[:n]
+        self._alloc(max(needed, 2 * len(self.keys)))
+        self.keys[:n], self.sums[:n], self.counts[:n] = keys, sums, counts
+
+    def add(self, user_ids, restaurant_ids, ratings, counts=None):
+        """Cộng 1 chunk (mảng numpy) vào bộ gộp."""
+        keys = (np.asarray(user_ids, np.int64) << 32) | np.asarray(restaurant_ids, np.int64)
+        if counts is None:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=ratings, minlength=len(keys)).astype(np.float32)
+            counts = np.bincount(inverse, minlength=len(keys)).astype(np.int32)
+        else:
+            sums = np.asarray(ratings, np.float32)   # đã gộp sẵn (key duy nhất, đã sắp xếp)
+
+        # Cặp đã có → cộng tại chỗ
+        n = self.size
+        pos = np.searchsorted(self.keys[:n], keys)
+        found = pos < n
+        found[found] = self.keys[pos[found]] == keys[found]
+        np.add.at(self.sums, pos[found], sums[found])
+        np.add.at(self.counts, pos[found], counts[found])
+
+        # Cặp mới → chèn, giữ thứ tự sắp xếp
+        new = ~found
+        m = int(new.sum())
+        if m == 0:
+            return
+        self._reserve(n + m)
+        target = pos[new] + np.arange(m)
+        keep = np.ones(n + m, dtype=bool)
+        keep[target] = False
+        for cur, buf, extra in (
+            (self.keys, self._keys_b, keys[new]),
+            (self.sums, self._sums_b, sums[new]),
+            (self.counts, self._counts_b, counts[new]),
+        ):
+            buf[:n + m][keep] = cur[:n]
+            buf[target] = extra
+        self.keys, self._keys_b = self._keys_b, self.keys
+        self.sums, self._sums_b = self._sums_b, self.sums
+        self.counts, self._counts_b = self._counts_b, self.counts
+        self.size = n + m
+
+    def merge(self, other):
+        """Gộp 1 PairAccumulator khác (vd. của bảng hành vi khác)."""
+        n = other.size
+        self.add(other.keys[:n] >> 32, other.keys[:n] & 0xFFFFFFFF,
+                 other.sums[:n], counts=other.counts[:n])
+
+    def to_frame(self, totals=False):
+        """
+        DataFrame (user_id int32, restaurant_id int32, rating float32 = trung bình, count).
+        - totals: trả tổng rating (cột rating_sum) thay vì trung bình
+        """
+        n = self.size
+        keys = self.keys[:n]
+        value = ("rating_sum", self.sums[:n].copy()) if totals else \
+            ("rating", (self.sums[:n] / self.counts[:n]).astype(np.float32))
+        return pd.DataFrame({
+            "user_id": (keys >> 32).astype(np.int32),
+            "restaurant_id": (keys & 0xFFFFFFFF).astype(np.int32),
+            value[0]: value[1],
+            "count": self.counts[:n].copy(),
+        })
+
+
+def stream_interactions(name, chunksize=None):
+    """
+    Đọc 1 bảng hành vi theo chunk bằng server-side cursor (stream_results),
+    ép kiểu gọn (int32 id, float32 rating) và gộp dần vào PairAccumulator.
+    """
+    chunksize = chunksize or CHUNK_SIZE
+    acc = PairAccumulator()
+    with get_engine().connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        for chunk in pd.read_sql(text(INTERACTION_SQL[name]), conn, chunksize=chunksize):
+            acc.add(
+                chunk["user_id"].to_numpy(np.int32),
+                chunk["restaurant_id"].to_numpy(np.int32),
+                chunk["rating"].to_numpy(np.float32),
+            )
+            if len(chunk):
+                acc.last_id = max(acc.last_id, int(chunk["id"].max()))
+    return acc
+
+
+def interaction_loaders(streaming=None):
+    """Các hàm load 4 bảng hành vi — bản đọc toàn bộ hoặc bản streaming."""
+    if streaming is None:
+        streaming = STREAMING_INGEST
+    if not streaming:
+        return INTERACTION_LOADERS
+    return {name: partial(stream_interactions, name) for name in INTERACTION_LOADERS}
+
+
+# ==========================================================
+# 4️⃣ Gộp dữ liệu cho huấn luyện CF + CBF
+# ==========================================================
+def source_interactions(tables):
+    """
+    Gộp từng bảng hành vi theo cặp (user, quán), giữ riêng từng nguồn:
+    dict tên -> DataFrame (user_id, restaurant_id, rating_sum, count).
+    - tables: dict tên bảng -> DataFrame, hoặc -> PairAccumulator (chế độ streaming)
+    """
+    sources = {}
+    for name in INTERACTION_LOADERS:
+        part = tables[name]
+        if isinstance(part, PairAccumulator):
+            sources[name] = part.to_frame(totals=True)
+        else:
+            sources[name] = (
+                part.groupby(["user_id", "restaurant_id"])
+                .agg(rating_sum=("rating", "sum"), count=("rating", "size"))
+                .reset_index()
+            )
+    return sources
+
+
+def source_marks(tables):
+    """
+    Id dòng lớn nhất đã nạp của từng bảng hành vi: {tên: id} (0 nếu bảng rỗng).
+    Hành vi online có id <= mốc đã nằm trong snapshot → không áp lại sau publish.
+    """
+    marks = {}
+    for name in INTERACTION_LOADERS:
+        part = tables[name]
+        if isinstance(part, PairAccumulator):
+            marks[name] = part.last_id
+        else:
+            marks[name] = int(part["id"].max()) if len(part) else 0
+    return marks
+
+
+def source_values(name, frame, weight):
+    """Tổng rating đã nhân trọng số của 1 nguồn: sao × w (reviews) hoặc số hành vi × w."""
+    base = frame["rating_sum"] if name == REVIEW_SOURCE else frame["count"]
+    return weight * base.to_numpy(np.float64)
+
+
+def combine_sources(sources, weights=None):
+    """
+    Gộp các nguồn thành 1 DataFrame: user_id, restaurant_id, rating, count
+    rating = Σ w·giá trị / Σ số hành vi (chỉ các nguồn w > 0).
+    - weights: ghi đè DEFAULT_SOURCE_WEIGHTS theo tên nguồn
+    """
+    weights = {**DEFAULT_SOURCE_WEIGHTS, **(weights or {})}
+    parts = [
+        pd.DataFrame({
+            "user_id": frame["user_id"].to_numpy(),
+            "restaurant_id": frame["restaurant_id"].to_numpy(),
+            "value": source_values(name, frame, weights[name]),
+            "count": frame["count"].to_numpy(),
+        })
+        for name, frame in sources.items() if weights[name] > 0
+    ]
+    if not parts:
+        return pd.DataFrame(columns=["user_id", "restaurant_id", "rating", "count"])
+
+    # Gom nhóm nếu user có nhiều hành vi trên cùng quán
+    # (giữ số hành vi để cập nhật online đúng trung bình)
+    combined = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(["user_id", "restaurant_id"])
+        .agg(value=("value", "sum"), count=("count", "sum"))
+        .reset_index()
+    )
+    combined["rating"] = combined["value"] / combined["count"]
+    return combined[["user_id", "restaurant_id", "rating", "count"]]
+
+
+def combine_interactions(tables, weights=None):
+    """
+    Gộp tất cả hành vi (reviews + favorites + likes + comments)
+    thành 1 DataFrame duy nhất: user_id, restaurant_id, rating, count
+    - tables: dict tên bảng -> DataFrame, hoặc -> PairAccumulator (chế độ streaming)
+    """
+    return combine_sources(source_interactions(tables), weights)
+
+
+def load_all_data(timeout=QUERY_TIMEOUT, streaming=None):
+    """
+    Load song song 4 bảng hành vi rồi gộp lại.
+    - streaming: đọc theo chunk (mặc định theo STREAMING_INGEST)
+    Raise DataLoadError nếu một bảng bất kỳ lỗi — caller quyết định giữ dữ liệu cũ.
+    """
+    all_data = combine_interactions(
+        load_tables_parallel(interaction_loaders(streaming), timeout)
+    )
+    print(f"✅ Load dữ liệu huấn luyện thành công: {len(all_data)} bản ghi.")
+    return all_data
+
+
+def load_training_snapshot(timeout=QUERY_TIMEOUT, streaming=None, extra_loaders=None):
+    """
+    Load song song toàn bộ dữ liệu cho 1 vòng huấn luyện (6 truy vấn cùng lúc).
+    - extra_loaders: dict tên -> hàm load thêm, chạy cùng lượt (vd. review_texts)
+    Trả về dict: sources (hành vi tách theo nguồn, xem source_interactions),
+    marks (id lớn nhất đã nạp mỗi nguồn, xem source_marks), restaurants, categories
+    (+ các bảng extra).
+    Raise DataLoadError nếu một bảng bất kỳ lỗi hoặc quá hạn.
+    """
+    extra_loaders = extra_loaders or {}
+    tables = load_tables_parallel(
+        {**interaction_loaders(streaming), **CATALOG_LOADERS, **extra_loaders}, timeout
+    )
+    return {
+        "sources": source_interactions(tables),
+        "marks": source_marks(tables),
+        "restaurants": tables["restaurants"],
+        "categories": tables["categories"],
+        **{name: tables[name] for name in extra_loaders},
+    }
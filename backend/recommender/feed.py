@@ -0,0 +1,152 @@
+# ==========================================================
+# feed.py — Feed cuộn vô hạn: phân trang bằng cursor trên danh sách xếp hạng cache
+# ----------------------------------------------------------
+# Trang đầu: tính 1 danh sách dài FEED_LENGTH cho (user, version + revision model, tham số)
+# rồi lưu gọn (id int32 + score float32) trong LRU. Các trang sau chỉ cắt mảng
+# theo cursor → O(page size), thứ tự không đổi trong cùng 1 version / revision.
+# Danh sách được bù bằng quán phổ biến nên trang sâu không bị hết đột ngột.
+# Danh sách tính lúc degraded (quá tải / hết giờ / lỗi) chỉ sống FEED_DEGRADED_TTL
+# giây để cursor đang cuộn còn dùng được; trang đầu luôn tính lại thay vì dùng nó.
+# ==========================================================
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from model_state import model_data
+from online_update import get_user_row
+
+# --- Cấu hình ---
+FEED_LENGTH = 300          # số quán tính sẵn cho 1 feed
+FEED_PAGE_SIZE = 10        # số quán mỗi trang (mặc định)
+MAX_PAGE_SIZE = 50
+FEED_CACHE_SIZE = 10_000   # số danh sách giữ trong LRU (~2.4 KB / danh sách 300 quán)
+FEED_BUDGET_MS = 1000      # budget mặc định cho lần tính trang đầu
+FEED_DEGRADED_TTL = 60     # giây giữ danh sách tính lúc degraded
+
+
+class CursorError(ValueError):
+    """Cursor hỏng hoặc không thuộc user này."""
+
+
+# ==========================================================
+# 🔖 Cursor (opaque, base64url)
+# ==========================================================
+def encode_cursor(user_id, revision, key, offset):
+    raw = json.dumps([user_id, list(revision), key, offset], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, user_id):
+    """Trả về ((version, revision), key, offset); raise CursorError nếu sai định dạng / khác user."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        owner, revision, key, offset = json.loads(raw)
+        revision, offset = (int(revision[0]), int(revision[1])), int(offset)
+        key = [str(key[0]), str(key[1]), float(key[2]), float(key[3])]
+    except (ValueError, TypeError, IndexError):
+        raise CursorError("cursor không hợp lệ")
+    if owner != user_id:
+        raise CursorError("cursor không thuộc user này")
+    if offset < 0:
+        raise CursorError("cursor không hợp lệ")
+    return revision, key, offset
+
+
+def feed_key(variant, cf_mode, alpha_cf, alpha_cbf):
+    """Các tham số quyết định thứ tự feed (đi kèm cursor)."""
+    return [variant, cf_mode, float(alpha_cf), float(alpha_cbf)]
+
+
+# ==========================================================
+# 🗃️ LRU các danh sách đã xếp hạng
+# ==========================================================
+class FeedCache:
+    """
+    (user_id, (version, revision), key) -> (ids int32, scores float32, mode, degraded).
+    Thread-safe LRU; entry degraded hết hạn sau FEED_DEGRADED_TTL giây.
+    """
+
+    def __init__(self, max_entries=FEED_CACHE_SIZE, degraded_ttl=FEED_DEGRADED_TTL):
+        self.max_entries = max_entries
+        self.degraded_ttl = degraded_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id, revision, key):
+        return (user_id, revision, *key)
+
+    def get(self, user_id, revision, key):
+        k = self._key(user_id, revision, key)
+        with self._lock:
+            entry, expires = self._entries.get(k, (None, None))
+            if entry is not None and expires is not None and time.monotonic() >= expires:
+                del self._entries[k]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return entry
+
+    def put(self, user_id, revision, key, entry):
+        expires = time.monotonic() + self.degraded_ttl if entry[3] is not None else None
+        with self._lock:
+            self._entries[self._key(user_id, revision, key)] = (entry, expires)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def status(self):
+        with self._lock:
+            nbytes = sum(entry[0].nbytes + entry[1].nbytes for entry, _ in self._entries.values())
+            return {"entries": len(self._entries), "bytes": nbytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+feed_cache = FeedCache()
+
+
+# ==========================================================
+# 📜 Dựng danh sách & cắt trang
+# ==========================================================
+def build_ranked_list(recs, user_id, length=FEED_LENGTH, mode=None, degraded=None):
+    """
+    recs: DataFrame (id, score) đã xếp hạng. Bù phần thiếu bằng quán phổ biến
+    (bỏ quán đã xem / đã có) tới `length`. Trả về entry gọn cho FeedCache.
+    """
+    ids = recs["id"].to_numpy(np.int64)[:length]
+    scores = recs["score"].to_numpy(np.float32)[:length]
+
+    rank, item_ids = model_data.get("popular_rank"), model_data.get("item_ids")
+    if len(ids) < length and rank is not None and item_ids is not None:
+        row = get_user_row(user_id)
+        seen = item_ids[row[0]] if row is not None else np.empty(0, np.int64)
+        extra = item_ids[rank]
+        extra = extra[~np.isin(extra, ids) & ~np.isin(extra, seen)][:length - len(ids)]
+        ids = np.concatenate([ids, extra])
+        scores = np.concatenate([scores, np.zeros(len(extra), np.float32)])
+
+    return ids.astype(np.int32), scores.astype(np.float32), mode, degraded
+
+
+def page_frame(entry, offset, size):
+    """Trang [offset, offset + size) → DataFrame (id, name, score) — chỉ chạm `size` quán."""
+    ids, scores = entry[0], entry[1]
+    ids, scores = ids[offset:offset + size], scores[offset:offset + size]
+    restaurants, item_ids = model_data.get("restaurants"), model_data.get("item_ids")
+    names = [None] * len(ids)
+    if item_ids is not None and len(item_ids) and len(ids):
+        rows = np.searchsorted(item_ids, ids).clip(max=len(item_ids) - 1)
+        found = item_ids[rows] == ids
+        all_names = restaurants["name"].to_numpy()
+        names = [all_names[r] if ok else None for r, ok in zip(rows.tolist(), found.tolist())]
+    return pd.DataFrame({"id": ids, "name": names, "score": scores})
@@ -1,27 +1,60 @@
 # hybrid.py
+import traceback
 import pandas as pd
-from cf import recommend_for_user as cf_recommend_for_user
+from cf import recommend_for_user as cf_recommend_for_user, recommend_item_based, \
+    recommend_matrix_factorization
 from cbf import recommend_cbf
 from sklearn.preprocessing import MinMaxScaler
 
-def hybrid_recommend(user_id, top_n=5, alpha_cf=0.6, alpha_cbf=0.4, min_ratings=0):
+# Nguồn CF có thể chọn: "user" (user-user), "item" (item-item, precompute)
+# hoặc "mf" (phân rã ma trận — cần item_factors, xem variants.py)
+CF_SOURCES = {
+    "user": cf_recommend_for_user,
+    "item": recommend_item_based,
+    "mf": recommend_matrix_factorization,
+}
+DEFAULT_CF_MODE = "user"
+
+# Số ứng viên lấy từ mỗi nguồn CF / CBF trước khi trộn (tối thiểu = top_n)
+CANDIDATE_POOL = 50
+
+
+def hybrid_recommend(user_id, top_n=5, alpha_cf=0.6, alpha_cbf=0.4, min_ratings=0,
+                     cf_mode=DEFAULT_CF_MODE, deadline=None, candidate_pool=CANDIDATE_POOL):
     """
     Mô hình kết hợp CF + CBF.
     - alpha_cf, alpha_cbf: trọng số CF/CBF (tổng = 1)
+    - cf_mode: nguồn CF trong CF_SOURCES ("user" | "item" | "mf")
+    - deadline: request_budget.Deadline; hết hạn sau CF → bỏ CBF, attrs["mode"] = "cf_only"
+    - candidate_pool: số ứng viên mỗi nguồn (tự nâng lên top_n nếu nhỏ hơn)
     - Nếu 1 trong 2 mô hình không có dữ liệu → fallback sang mô hình còn lại.
+    Kết quả không trộn đủ 2 nguồn được gắn attrs["mode"] ("cf_only" | "cbf_only"),
+    kèm attrs["degraded"] (lý do) khi do hết giờ / lỗi chứ không phải do thiếu dữ liệu.
     """
+    if cf_mode not in CF_SOURCES:
+        raise ValueError(f"cf_mode không hợp lệ: {cf_mode} (chọn: {', '.join(CF_SOURCES)})")
+
+    pool = max(candidate_pool, top_n)
 
     # --- CF ---
-    cf_df = cf_recommend_for_user(user_id, top_n=50, exclude_user_rated=True)
+    try:
+        cf_df = CF_SOURCES[cf_mode](user_id, top_n=pool, exclude_user_rated=True)
+    except Exception:
+        print(f"❌ CF lỗi → fallback sang CBF:\n{traceback.format_exc()}")
+        return _single_source(recommend_cbf(user_id, top_n=top_n), "cbf_only", "cf_error")
     if cf_df is None or cf_df.empty:
         print("⚠️ CF rỗng → fallback sang CBF.")
-        return recommend_cbf(user_id, top_n=top_n)
+        return _single_source(recommend_cbf(user_id, top_n=top_n), "cbf_only")
+
+    if deadline is not None and deadline.expired():
+        print("⏱️ Hết thời gian sau CF → bỏ CBF.")
+        return _single_source(cf_df.head(top_n), "cf_only", "cbf_timeout")
 
     # --- CBF ---
-    cbf_df = recommend_cbf(user_id, top_n=50)
+    cbf_df = recommend_cbf(user_id, top_n=pool)
     if cbf_df is None or cbf_df.empty:
         print("⚠️ CBF rỗng → fallback sang CF.")
-        return cf_df.rename(columns={'score': 'score_final'}).head(top_n)
+        return _single_source(cf_df.head(top_n), "cf_only")
 
     # --- Chuẩn hóa cột ---
     cf_df = cf_df.rename(columns={'score': 'score_cf'})
@@ -50,6 +83,16 @@ def hybrid_recommend(user_id, top_n=5, alpha_cf=0.6, alpha_cbf=0.4, min_ratings=
     return top_recs[['id', 'name', 'score_final']]
 
 
+def _single_source(recs, mode, degraded=None):
+    """Kết quả chỉ từ 1 nguồn (id, name, score_final) + nhãn mode / lý do degraded."""
+    recs = recs.rename(columns={'score': 'score_final'}).reset_index(drop=True)
+    recs = recs.reindex(columns=['id', 'name', 'score_final'])
+    recs.attrs["mode"] = mode
+    if degraded:
+        recs.attrs["degraded"] = degraded
+    return recs
+
+
 # Test trực tiếp
 if __name__ == "__main__":
     recs = hybrid_recommend(user_id=4, top_n=5, alpha_cf=0.6, alpha_cbf=0.4)
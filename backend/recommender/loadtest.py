@@ -0,0 +1,365 @@
+# ==========================================================
+# loadtest.py — Bắn tải /recommend để đo sức chịu trước sự kiện
+# ----------------------------------------------------------
+# Nguồn request:
+#   - synthetic: user_id lệch kiểu Zipf (ít user rất hoạt động, đuôi dài)
+#                + tỉ lệ user mới, trộn tham số theo PARAM_MIX
+#   - replay:    đọc lại access log (dòng có "GET /recommend?...")
+# Đích:
+#   - in-process: Flask test client (không cần bật server, trainer chạy thật)
+#   - --url:      server đang chạy (http://127.0.0.1:5000)
+# Báo cáo: throughput, p50/p95/p99, tỉ lệ lỗi / 429 / degraded, và request nào
+# trùng lúc trainer đang chạy (theo dõi /model-status trong lúc bắn).
+#
+#   python loadtest.py --requests 2000 --concurrency 16 --rate 200
+#   python loadtest.py --url http://127.0.0.1:5000 --replay access.log
+# ==========================================================
+
+import argparse
+import csv
+import json
+import queue
+import re
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import urlopen
+
+import numpy as np
+
+# --- Cấu hình mặc định ---
+ZIPF_EXPONENT = 1.1       # độ lệch user: xác suất user hạng r ∝ 1 / r^s
+COLD_USER_RATE = 0.05     # tỉ lệ request từ user chưa có hành vi
+STATUS_POLL = 0.2         # chu kỳ đọc /model-status (giây)
+REQUEST_TIMEOUT = 10      # timeout HTTP (giây, chế độ --url)
+
+# Trộn tham số: (trọng số, query thêm) — giống lưu lượng thật từ Laravel
+PARAM_MIX = [
+    (0.55, {"top_n": 5, "include": "card"}),
+    (0.20, {"top_n": 5}),
+    (0.10, {"top_n": 10, "cf_mode": "item"}),
+    (0.10, {"top_n": 20, "format": "compact"}),
+    (0.05, {"top_n": 5, "alpha_cf": 0.3, "alpha_cbf": 0.7}),
+]
+
+_LOG_RE = re.compile(r"GET (/recommend\?[^\s\"]+)")
+
+
+# ==========================================================
+# 1️⃣ Sinh / đọc luồng request
+# ==========================================================
+def synthetic_stream(n, user_ids, zipf_exponent=ZIPF_EXPONENT,
+                     cold_rate=COLD_USER_RATE, param_mix=PARAM_MIX, seed=0):
+    """n đường dẫn /recommend?...: user theo Zipf trên user_ids (thứ tự ngẫu nhiên)."""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.permutation(np.asarray(user_ids))
+    weights = 1.0 / np.arange(1, len(user_ids) + 1) ** zipf_exponent
+    users = rng.choice(user_ids, size=n, p=weights / weights.sum())
+
+    # User mới: id lớn hơn mọi user đã biết
+    cold = rng.random(n) < cold_rate
+    next_id = int(user_ids.max()) + 1
+    users[cold] = next_id + rng.integers(0, 1_000_000, int(cold.sum()))
+
+    mix_p = np.array([w for w, _ in param_mix], dtype=float)
+    picks = rng.choice(len(param_mix), size=n, p=mix_p / mix_p.sum())
+    return [f"/recommend?{urlencode({'user_id': int(u), **param_mix[p][1]})}"
+            for u, p in zip(users.tolist(), picks.tolist())]
+
+
+def replay_stream(path, limit=None):
+    """Các đường dẫn /recommend?... trong access log (werkzeug / nginx), theo thứ tự."""
+    paths = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _LOG_RE.search(line)
+            if match:
+                paths.append(match.group(1))
+                if limit and len(paths) >= limit:
+                    break
+    return paths
+
+
+# ==========================================================
+# 2️⃣ Đích bắn: Flask test client hoặc HTTP
+# ==========================================================
+class InProcessTarget:
+    """Gọi app Flask trong cùng tiến trình (mỗi thread 1 test client)."""
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def get(self, path):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.get(path)
+        return response.status_code, response.data, response.mimetype
+
+
+class HttpTarget:
+    """Gọi server đang chạy qua HTTP (chỉ dùng thư viện chuẩn)."""
+
+    def __init__(self, base_url, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def get(self, path):
+        try:
+            with urlopen(self.base_url + path, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers.get_content_type()
+        except HTTPError as e:
+            return e.code, e.read(), e.headers.get_content_type()
+
+
+def _decode(body, mimetype):
+    if mimetype == "application/x-msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            return {}
+        return msgpack.unpackb(body)
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {}
+
+
+# ==========================================================
+# 3️⃣ Theo dõi trainer trong lúc bắn tải
+# ==========================================================
+class TrainerWatcher(threading.Thread):
+    """
+    Đọc /model-status định kỳ, ghi lại các khoảng trainer đang chạy.
+    - trainer thread: dùng running / last_start / last_end của scheduler
+    - trainer process/external: không thấy scheduler → coi khoảng giữa 2 lần
+      đọc mà version đổi là 1 vòng (thời điểm publish)
+    """
+
+    def __init__(self, target, interval=STATUS_POLL):
+        super().__init__(daemon=True)
+        self.target = target
+        self.interval = interval
+        self.cycles = set()           # (start, end) theo time.time()
+        self.versions = []
+        self._done = threading.Event()
+        self._open = None             # start của vòng đang chạy
+        self._last_poll = None
+        self._last_version = None
+
+    def run(self):
+        while not self._done.is_set():
+            self.poll()
+            self._done.wait(self.interval)
+        self.poll()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        if self._open is not None:
+            self.cycles.add((self._open, time.time()))
+
+    def poll(self):
+        now = time.time()
+        try:
+            status, body, mimetype = self.target.get("/model-status")
+        except Exception:
+            return
+        if status != 200:
+            return
+        summary = _decode(body, mimetype)
+        version = summary.get("version")
+        scheduler = (summary.get("trainer") or {}).get("scheduler")
+
+        if scheduler:
+            last_start, last_end = scheduler.get("last_start"), scheduler.get("last_end")
+            if scheduler.get("running"):
+                self._open = last_start
+            elif last_start and last_end and last_end >= last_start:
+                self.cycles.add((last_start, last_end))
+                self._open = None
+        elif self._last_version is not None and version != self._last_version:
+            self.cycles.add((self._last_poll, now))
+
+        if version != self._last_version:
+            self.versions.append(version)
+        self._last_version, self._last_poll = version, now
+
+    def overlaps(self, start, end):
+        return any(s <= end and start <= e for s, e in self.cycles)
+
+
+# ==========================================================
+# 4️⃣ Chạy tải
+# ==========================================================
+def run_load(target, paths, concurrency=8, rate=None, watch_trainer=True):
+    """
+    Bắn `paths` bằng `concurrency` thread.
+    - rate: request/giây (open-loop, đến hạn mới gửi); None = gửi liên tục
+    Trả về list kết quả từng request.
+    """
+    jobs = queue.Queue()
+    for i, path in enumerate(paths):
+        jobs.put((i, path))
+    results = [None] * len(paths)
+
+    watcher = TrainerWatcher(target) if watch_trainer else None
+    if watcher:
+        watcher.start()
+
+    t0 = time.time()
+
+    def worker():
+        while True:
+            try:
+                i, path = jobs.get_nowait()
+            except queue.Empty:
+                return
+            if rate:
+                delay = t0 + i / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.time()
+            try:
+                status, body, mimetype = target.get(path)
+                payload = _decode(body, mimetype) if status == 200 else {}
+                error = None
+            except Exception as e:
+                status, payload, error = None, {}, repr(e)
+            end = time.time()
+            results[i] = {
+                "path": path,
+                "start": start,
+                "latency_ms": (end - start) * 1000,
+                "status": status,
+                "error": error,
+                "mode": payload.get("mode"),
+                "degraded": payload.get("degraded"),
+                "version": payload.get("version"),
+                "end": end,
+            }
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if watcher:
+        watcher.stop()
+    for r in results:
+        r["trainer_overlap"] = bool(watcher and watcher.overlaps(r["start"], r["end"]))
+    return results
+
+
+# ==========================================================
+# 5️⃣ Báo cáo
+# ==========================================================
+def _percentiles(latencies):
+    if len(latencies) == 0:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2)}
+
+
+def summarize(results):
+    """Tổng hợp: throughput, phân vị độ trễ, tỉ lệ lỗi / 429 / degraded, trùng trainer."""
+    n = len(results)
+    if n == 0:
+        return {"requests": 0}
+    latencies = np.array([r["latency_ms"] for r in results])
+    status = [r["status"] for r in results]
+    duration = max(r["end"] for r in results) - min(r["start"] for r in results)
+    overlap = np.array([r["trainer_overlap"] for r in results])
+
+    modes = {}
+    for r in results:
+        if r["mode"]:
+            modes[r["mode"]] = modes.get(r["mode"], 0) + 1
+
+    return {
+        "requests": n,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(n / duration, 1) if duration > 0 else None,
+        "latency_ms": _percentiles(latencies),
+        "error_rate": round(sum(s is None or s >= 500 for s in status) / n, 4),
+        "rejected_rate": round(sum(s == 429 for s in status) / n, 4),
+        "client_error_rate": round(sum(s is not None and 400 <= s < 500 and s != 429
+                                       for s in status) / n, 4),
+        "degraded_rate": round(sum(bool(r["degraded"]) for r in results) / n, 4),
+        "modes": modes,
+        "trainer_overlap_rate": round(float(overlap.mean()), 4),
+        "latency_ms_trainer_overlap": _percentiles(latencies[overlap]),
+        "latency_ms_trainer_idle": _percentiles(latencies[~overlap]),
+        "versions_seen": sorted({r["version"] for r in results if r["version"] is not None}),
+    }
+
+
+def print_report(summary):
+    print("\n===== 📊 KẾT QUẢ LOAD TEST =====")
+    for key, value in summary.items():
+        print(f"{key:<28} {value}")
+
+
+def write_csv(results, path):
+    fields = ["path", "start", "latency_ms", "status", "error", "mode", "degraded",
+              "version", "trainer_overlap"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _known_users(target, wait):
+    """Danh sách user_id để sinh tải: lấy từ model trong tiến trình, nếu không có thì 1..1000."""
+    if isinstance(target, InProcessTarget):
+        from model_state import model_data
+        deadline = time.time() + wait
+        while not model_data.get("user_index") and time.time() < deadline:
+            time.sleep(0.5)
+        if model_data.get("user_index"):
+            return list(model_data["user_index"])
+    return list(range(1, 1001))
+
+
+# ==========================================================
+# 🚀 Chạy từ dòng lệnh
+# ==========================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /recommend")
+    parser.add_argument("--url", help="server đang chạy; bỏ trống = Flask test client trong tiến trình")
+    parser.add_argument("--replay", help="access log để phát lại thay vì sinh tải")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="request/giây (mặc định: tối đa)")
+    parser.add_argument("--zipf", type=float, default=ZIPF_EXPONENT)
+    parser.add_argument("--cold-rate", type=float, default=COLD_USER_RATE)
+    parser.add_argument("--users", type=int, default=None, help="số user synthetic (mặc định: user trong model)")
+    parser.add_argument("--budget-ms", type=int, default=None, help="gắn budget_ms vào mọi request")
+    parser.add_argument("--warmup", type=float, default=60, help="chờ model sẵn sàng (giây, in-process)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="ghi kết quả từng request ra file CSV")
+    parser.add_argument("--no-trainer-watch", action="store_true")
+    args = parser.parse_args()
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+
+    if args.replay:
+        paths = replay_stream(args.replay, limit=args.requests)
+    else:
+        user_ids = list(range(1, args.users + 1)) if args.users else _known_users(target, args.warmup)
+        paths = synthetic_stream(args.requests, user_ids, args.zipf, args.cold_rate, seed=args.seed)
+    if args.budget_ms:
+        paths = [f"{p}&budget_ms={args.budget_ms}" for p in paths]
+
+    where = urlsplit(args.url).netloc if args.url else "in-process"
+    print(f"🚀 Bắn {len(paths)} request → {where} | concurrency={args.concurrency} | rate={args.rate or 'max'}")
+    results = run_load(target, paths, args.concurrency, args.rate,
+                       watch_trainer=not args.no_trainer_watch)
+    print_report(summarize(results))
+    if args.csv:
+        write_csv(results, args.csv)
+        print(f"💾 Đã ghi {len(results)} dòng → {args.csv}")
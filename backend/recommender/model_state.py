@@ -5,22 +5,170 @@
 # Dùng chung cho CBF, CF, và Hybrid
 # ==========================================================
 
+import contextvars
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from functools import wraps
+from types import MappingProxyType
 import pandas as pd
 
+# Overlay của variant đang phục vụ request hiện tại (xem variants.py)
+_overlay = contextvars.ContextVar("model_overlay", default=None)
+# Snapshot model đã gắn cho request hiện tại (bind_model)
+_bound = contextvars.ContextVar("model_snapshot", default=None)
+
+
+class ModelData(Mapping):
+    """
+    Cửa đọc model đang phục vụ. Mỗi lần publish tạo 1 snapshot mới (dict chỉ đọc)
+    rồi đổi tham chiếu → không ai thấy model ghép dở giữa 2 version.
+    - Trong `bind_model()`: mọi lần đọc dùng đúng snapshot đã gắn lúc vào request
+      (kể cả trong worker của request_budget — ContextVar được sao chép theo).
+    - Trong `model_overlay(...)`: các khóa có trong overlay được đọc từ overlay,
+      còn lại đọc snapshot → variant chỉ giữ phần khác biệt, mảng gốc dùng chung.
+    """
+
+    def __init__(self, initial):
+        self._latest = MappingProxyType(dict(initial))
+
+    def snapshot(self):
+        """Snapshot đang gắn cho request (mặc định: bản publish mới nhất)."""
+        bound = _bound.get()
+        return bound if bound is not None else self._latest
+
+    def __getitem__(self, key):
+        overlay = _overlay.get()
+        if overlay is not None and key in overlay:
+            return overlay[key]
+        return self.snapshot()[key]
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.snapshot())
+
+
+@contextmanager
+def model_overlay(overrides):
+    """Đọc model_data qua overlay `overrides` (dict) trong khối with — theo từng request/thread."""
+    token = _overlay.set(overrides)
+    try:
+        yield
+    finally:
+        _overlay.reset(token)
+
+
+def current_overlay():
+    """Overlay đang áp dụng (None = model gốc)."""
+    return _overlay.get()
+
+
+@contextmanager
+def bind_model(snapshot=None):
+    """
+    Gắn 1 snapshot model cho khối with và trả về nó.
+    Mặc định: snapshot đã gắn ở khối ngoài, nếu không có thì bản publish mới nhất.
+    """
+    if snapshot is None:
+        snapshot = model_data.snapshot()
+    token = _bound.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _bound.reset(token)
+
+
+def with_bound_model(func):
+    """Decorator cho handler: gắn snapshot 1 lần lúc vào request."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with bind_model():
+            return func(*args, **kwargs)
+    return wrapper
+
+
 # Biến toàn cục model_data sẽ chứa các dữ liệu mới nhất
 # được cập nhật định kỳ bởi auto_trainer.py
-model_data = {
+model_data = ModelData({
     # Dữ liệu gốc từ MySQL
     "restaurants": pd.DataFrame(),    # danh sách quán ăn
     "all_data": pd.DataFrame(),       # dữ liệu gộp (review + like + favorite + comment)
 
     # Ma trận và mô hình đã train
-    "feature_matrix": None,           # TF-IDF feature cho CBF
-    "user_item_matrix": None,         # Ma trận user-item cho CF
+    "feature_matrix": None,           # TF-IDF feature cho CBF (None khi dùng item_embeddings)
+    "item_vectors": None,             # feature_matrix chuẩn hóa L2 theo hàng (kernel CBF)
+    "item_embeddings": None,          # embedding float32 (items × dim) từ truncated SVD, tùy chọn
+
+    # CF (precompute trong auto_trainer) — cột i = hàng i của restaurants
+    "user_index": {},                 # user_id -> hàng trong user_item_sparse
+    "item_ids": None,                 # restaurant_id theo cột
+    "user_item_sparse": None,         # csr users × items (rating trung bình)
+    "user_item_counts": None,         # csr số hành vi mỗi cặp (cập nhật online)
+    "user_item_normalized": None,     # csr users × items, mỗi hàng chuẩn hóa L2 (user-user CF)
+    "item_user_normalized": None,     # chuyển vị của user_item_normalized
+    "item_similarity": None,          # csr items × items, top-k láng giềng mỗi quán
+    "popularity": None,               # số user đã tương tác với mỗi quán
+    "popular_rank": None,             # cột theo popularity giảm dần (chế độ degraded)
+    "snapshot_time": None,            # thời điểm bắt đầu tải snapshot
+    "source_marks": None,             # id dòng lớn nhất đã nạp mỗi bảng hành vi (đối soát online)
+    "interaction_sources": None,      # SourceMatrices: hành vi tách theo nguồn (đổi trọng số không cần DB)
+    "source_weights": None,           # trọng số đã dùng để gộp user_item_sparse
+
+    # Variant A/B (variants.py) — trainer dựng cùng vòng với model gốc
+    "variant_overlays": {},           # tên variant -> overlay (chỉ các khóa khác model gốc)
+    "variant_builds": {},             # tên variant -> build_ms, overlay_bytes
+
+    # Thẻ quán serialize sẵn (cards.py) — hàng i = item_ids[i]
+    "card_json": None,                # list chuỗi JSON
+    "card_msgpack": None,             # list bytes msgpack (None nếu thiếu msgpack)
 
     # Thông tin cập nhật
-    "last_update": None               # Thời gian cập nhật gần nhất
-}
+    "last_update": None,              # Thời gian cập nhật gần nhất
+    "version": 0,                     # Tăng 1 mỗi lần trainer publish model mới (= VERSION artifact)
+    "revision": 0                     # Tăng 1 mỗi lần đổi model tại chỗ (vd. trọng số nguồn); về 0 khi có version mới
+})
+
+_publish_lock = threading.Lock()
+_publish_listeners = []
+
+
+def add_publish_listener(callback):
+    """Đăng ký hàm callback(snapshot) chạy ngay sau mỗi lần publish model mới."""
+    _publish_listeners.append(callback)
+
+
+# ==========================================================
+# 📦 Publish model mới
+# ==========================================================
+def publish_model(artifacts, version=None, local=False):
+    """
+    Tạo snapshot mới = snapshot hiện tại + artifacts rồi đổi tham chiếu (1 phép gán):
+    request đã gắn snapshot cũ đọc tiếp bản cũ tới hết, request mới thấy bản mới.
+    - version: giữ số version của trainer ngoài tiến trình (mặc định = version + 1)
+    - local: model dựng lại tại chỗ từ cùng snapshot (không qua trainer) → giữ version,
+      chỉ tăng revision; version luôn khớp VERSION artifact nên model_store không bỏ sót bản mới
+    """
+    with _publish_lock:
+        current = model_data._latest
+        if local:
+            new_version, revision = current["version"], current["revision"] + 1
+        else:
+            new_version = version if version is not None else current["version"] + 1
+            revision = 0
+        snapshot = MappingProxyType({**current, **artifacts,
+                                     "version": new_version, "revision": revision})
+        model_data._latest = snapshot
+        with bind_model(snapshot):
+            for callback in _publish_listeners:
+                callback(snapshot)
+    return new_version
+
+
+def model_revision():
+    """(version, revision) của snapshot đang gắn cho request — định danh duy nhất, dùng làm khóa cache."""
+    return model_data["version"], model_data["revision"]
 
 # ==========================================================
 # ⚙️ Hỗ trợ kiểm tra nhanh trạng thái model
@@ -32,8 +180,12 @@ def model_summary():
         "restaurants": len(model_data["restaurants"]),
         "interactions": len(model_data["all_data"]),
         "feature_matrix_ready": model_data["feature_matrix"] is not None,
-        "user_item_matrix_ready": model_data["user_item_matrix"] is not None,
-        "last_update": model_data["last_update"]
+        "item_embeddings_ready": model_data["item_embeddings"] is not None,
+        "user_item_matrix_ready": model_data["user_item_sparse"] is not None,
+        "item_similarity_ready": model_data["item_similarity"] is not None,
+        "last_update": model_data["last_update"],
+        "version": model_data["version"],
+        "revision": model_data["revision"]
     }
     return summary
 
@@ -0,0 +1,100 @@
+# ==========================================================
+# model_store.py — Trao đổi model giữa trainer và Flask qua file
+# ----------------------------------------------------------
+# Trainer chạy ở tiến trình riêng ghi artifact (pickle) + file VERSION.
+# Flask chỉ theo dõi VERSION rồi nạp artifact mới vào model_state,
+# nên request không phải tranh CPU/GIL với việc huấn luyện.
+# ==========================================================
+
+import os
+import pickle
+import threading
+import time
+
+from model_state import model_data, publish_model
+
+# Thư mục chứa artifact (đổi bằng biến môi trường nếu cần)
+ARTIFACT_DIR = os.environ.get(
+    "RECOMMENDER_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+)
+VERSION_FILE = "VERSION"
+KEEP_VERSIONS = 2      # số bản artifact cũ giữ lại trên đĩa
+
+
+def _artifact_path(directory, version):
+    return os.path.join(directory, f"model-{version}.pkl")
+
+
+def _write_atomic(path, payload, mode="wb"):
+    """Ghi ra file tạm rồi os.replace → bên đọc không bao giờ thấy file dở dang."""
+    tmp = f"{path}.tmp"
+    with open(tmp, mode) as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ==========================================================
+# ✍️ Phía trainer
+# ==========================================================
+def read_version(directory=ARTIFACT_DIR):
+    """Version mới nhất đã ghi (0 nếu chưa có)."""
+    try:
+        with open(os.path.join(directory, VERSION_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def save_artifacts(artifacts, directory=ARTIFACT_DIR):
+    """
+    Ghi artifact thành model-<version>.pkl rồi mới cập nhật file VERSION (tín hiệu).
+    Trả về version vừa ghi.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = read_version(directory) + 1
+    payload = pickle.dumps(artifacts, protocol=pickle.HIGHEST_PROTOCOL)
+    _write_atomic(_artifact_path(directory, version), payload)
+    _write_atomic(os.path.join(directory, VERSION_FILE), str(version), mode="w")
+
+    # Dọn bản cũ
+    stale = _artifact_path(directory, version - KEEP_VERSIONS)
+    if os.path.exists(stale):
+        os.remove(stale)
+    return version
+
+
+# ==========================================================
+# 📥 Phía Flask
+# ==========================================================
+def load_artifacts(version, directory=ARTIFACT_DIR):
+    with open(_artifact_path(directory, version), "rb") as f:
+        return pickle.load(f)
+
+
+def sync_latest(directory=ARTIFACT_DIR):
+    """Nạp artifact mới nếu VERSION lớn hơn version đang chạy. Trả về True nếu có cập nhật."""
+    version = read_version(directory)
+    if version <= model_data["version"]:
+        return False
+    publish_model(load_artifacts(version, directory), version=version)
+    print(f"📥 [ModelStore] Đã nạp model version {version} ({model_data['last_update']})")
+    return True
+
+
+def _watch(directory, poll_interval):
+    while True:
+        try:
+            sync_latest(directory)
+        except Exception as e:
+            print(f"❌ [ModelStore] Lỗi nạp artifact: {e}")
+        time.sleep(poll_interval)
+
+
+def start_artifact_watcher(directory=ARTIFACT_DIR, poll_interval=1.0):
+    """Thread nhẹ: chỉ đọc file VERSION mỗi poll_interval giây."""
+    thread = threading.Thread(target=_watch, args=(directory, poll_interval), daemon=True)
+    thread.start()
+    print(f"👀 [ModelStore] Theo dõi artifact tại {directory}")
@@ -0,0 +1,203 @@
+# ==========================================================
+# online_update.py — Cập nhật model ngay khi có hành vi mới
+# ----------------------------------------------------------
+# Mỗi hành vi (review / favorite / like / comment) được áp thẳng vào
+# model đang chạy, chi phí O(số quán user đã tương tác):
+# - hàng của user trong ma trận user–item (lưu bản online đè lên snapshot)
+# - danh sách quán đã xem (chính là các cột của hàng đó)
+# - hồ sơ CBF đã cache của user
+# - bộ đếm độ phổ biến của quán
+# Vòng huấn luyện đầy đủ chỉ còn là đối soát định kỳ.
+# ==========================================================
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from scipy import sparse
+
+from data_loader import BEHAVIOR_RATINGS, DEFAULT_SOURCE_WEIGHTS
+from model_state import model_data, add_publish_listener, current_overlay, bind_model
+
+# --- Cấu hình ---
+PROFILE_CACHE_SIZE = 5000    # số hồ sơ CBF giữ trong cache (LRU)
+EVENT_LOG_SIZE = 10000       # số hành vi gần nhất giữ lại để áp lại sau publish
+
+INTERACTION_KINDS = ("review",) + tuple(BEHAVIOR_RATINGS)
+
+_lock = threading.Lock()
+_base = {"snapshot": None}   # snapshot model mà _rows / _profiles được dựng trên đó
+_rows = {}                   # user_id -> (cols, ratings, counts) bản online
+_profiles = OrderedDict()    # user_id -> (tổng có trọng số 1×F, tổng trọng số)
+_events = deque(maxlen=EVENT_LOG_SIZE)
+
+_EMPTY_ROW = (np.empty(0, np.int32), np.empty(0, np.float32), np.empty(0, np.int32))
+
+
+# ==========================================================
+# 📖 Đọc hàng của user
+# ==========================================================
+def get_user_row(user_id):
+    """
+    (cols, ratings, counts) của user — cols đã sắp xếp, là index cột trong user_item_sparse
+    (= hàng trong restaurants). Ưu tiên bản online (chỉ khi request đang đọc đúng snapshot
+    mà bản online dựng trên đó); None nếu user chưa có hành vi (kể cả hàng rỗng).
+    """
+    row = _rows.get(user_id) if _base["snapshot"] is model_data.snapshot() else None
+    if row is not None:
+        return row
+    idx = model_data.get("user_index", {}).get(user_id)
+    user_item = model_data.get("user_item_sparse")
+    if idx is None or user_item is None:
+        return None
+    counts = model_data["user_item_counts"]
+    start, end = user_item.indptr[idx], user_item.indptr[idx + 1]
+    if start == end:
+        return None
+    return user_item.indices[start:end], user_item.data[start:end], counts.data[start:end]
+
+
+def get_cbf_profile(user_id):
+    """Hồ sơ CBF (1×F thưa) = trung bình có trọng số rating của vector quán. Có cache."""
+    overlay = current_overlay()
+    if (overlay is not None and "user_item_sparse" in overlay) or \
+            _base["snapshot"] is not model_data.snapshot():
+        # Variant có rating riêng / request còn đọc snapshot cũ → không dùng chung cache
+        row = get_user_row(user_id)
+        if row is None or model_data.get("feature_matrix") is None:
+            return None
+        cols, ratings, _ = row
+        weighted_sum = sparse.csr_matrix(ratings.reshape(1, -1)) @ model_data["feature_matrix"][cols]
+        return weighted_sum / (float(ratings.sum()) or 1.0)
+
+    with _lock:
+        cached = _profiles.get(user_id)
+        if cached is None:
+            row = get_user_row(user_id)
+            feature_matrix = model_data.get("feature_matrix")
+            if row is None or feature_matrix is None:
+                return None
+            cols, ratings, _ = row
+            weighted_sum = sparse.csr_matrix(ratings.reshape(1, -1)) @ feature_matrix[cols]
+            cached = (weighted_sum, float(ratings.sum()))
+            _profiles[user_id] = cached
+            if len(_profiles) > PROFILE_CACHE_SIZE:
+                _profiles.popitem(last=False)
+        else:
+            _profiles.move_to_end(user_id)
+
+    weighted_sum, denom = cached
+    return weighted_sum / (denom if denom != 0 else 1.0)
+
+
+# ==========================================================
+# ✍️ Áp 1 hành vi vào model
+# ==========================================================
+def apply_interaction(user_id, restaurant_id, rating=None, kind="review", at=None, source_id=None):
+    """
+    Cập nhật model cho 1 hành vi (user_id, restaurant_id, rating, kind).
+    - rating: bắt buộc với review; favorite/like/comment quy đổi theo trọng số nguồn
+      của model (mặc định BEHAVIOR_RATINGS).
+    - source_id: id dòng trong bảng của hành vi (reviews.id, likes.id, ...) → sau publish
+      chỉ áp lại khi id lớn hơn mốc đã nạp của snapshot (không cộng trùng).
+    Trả về rating trung bình mới của cặp (user, quán); None nếu nguồn đang bị tắt (w = 0).
+    """
+    if kind not in INTERACTION_KINDS:
+        raise ValueError(f"kind không hợp lệ: {kind} (chọn: {', '.join(INTERACTION_KINDS)})")
+    if kind == "review":
+        if rating is None:
+            raise ValueError("review cần rating")
+        rating = float(rating)
+    else:
+        rating = None    # quy đổi lúc áp (theo trọng số hiện hành, kể cả khi replay)
+
+    event = {"user_id": user_id, "restaurant_id": restaurant_id, "rating": rating,
+             "kind": kind, "at": at or time.time(), "source_id": source_id}
+    # Áp lên đúng snapshot của bản online (publish đang chờ _lock sẽ áp lại hành vi này)
+    with _lock, bind_model(_base["snapshot"]):
+        mean = _apply(event)
+        _events.append(event)
+    return mean
+
+
+def _apply(event):
+    item_ids = model_data.get("item_ids")
+    if item_ids is None:
+        raise RuntimeError("Model chưa sẵn sàng")
+    col = int(np.searchsorted(item_ids, event["restaurant_id"]))
+    if col >= len(item_ids) or item_ids[col] != event["restaurant_id"]:
+        raise ValueError(f"restaurant_id {event['restaurant_id']} chưa có trong model")
+
+    # Giá trị theo trọng số nguồn: sao × w (review) hoặc w (favorite / like / comment)
+    weight = (model_data.get("source_weights") or DEFAULT_SOURCE_WEIGHTS)[f"{event['kind']}s"]
+    if weight <= 0:
+        return None
+    user_id = event["user_id"]
+    rating = event["rating"] * weight if event["kind"] == "review" else weight
+    cols, ratings, counts = get_user_row(user_id) or _EMPTY_ROW
+    pos = int(np.searchsorted(cols, col))
+
+    if pos < len(cols) and cols[pos] == col:
+        # Cặp đã có → cập nhật trung bình
+        old = float(ratings[pos])
+        ratings, counts = ratings.copy(), counts.copy()
+        ratings[pos] = (old * counts[pos] + rating) / (counts[pos] + 1)
+        counts[pos] += 1
+        new = float(ratings[pos])
+    else:
+        # Cặp mới → chèn cột, tăng độ phổ biến
+        old, new = 0.0, rating
+        cols = np.insert(cols, pos, col).astype(np.int32)
+        ratings = np.insert(ratings, pos, rating).astype(np.float32)
+        counts = np.insert(counts, pos, 1).astype(np.int32)
+        popularity = model_data.get("popularity")
+        if popularity is not None:
+            popularity[col] += 1
+
+    _rows[user_id] = (cols, ratings, counts)
+
+    # Hồ sơ CBF đã cache: cộng phần chênh lệch của đúng 1 quán
+    cached = _profiles.get(user_id)
+    if cached is not None:
+        weighted_sum, denom = cached
+        delta = new - old
+        _profiles[user_id] = (weighted_sum + delta * model_data["feature_matrix"][col],
+                              denom + delta)
+    return new
+
+
+# ==========================================================
+# 🔄 Sau mỗi lần publish model mới
+# ==========================================================
+def _on_publish(snapshot):
+    """
+    Snapshot mới đã gồm các hành vi trong DB → bỏ bản online,
+    rồi áp lại các hành vi chưa có trong snapshot: id dòng > mốc đã nạp của bảng đó
+    (source_marks); hành vi không kèm id thì so với mốc bắt đầu tải snapshot.
+    """
+    with _lock:
+        _base["snapshot"] = snapshot
+        _rows.clear()
+        _profiles.clear()
+        marks = snapshot.get("source_marks") or {}
+        snapshot_time = snapshot.get("snapshot_time")
+        for event in list(_events):
+            mark = marks.get(f"{event['kind']}s")
+            if event["source_id"] is not None and mark is not None:
+                newer = event["source_id"] > mark
+            else:
+                newer = snapshot_time is not None and event["at"] >= snapshot_time
+            if newer:
+                try:
+                    _apply(event)
+                except ValueError:
+                    pass     # quán đã bị xóa khỏi snapshot mới
+
+
+add_publish_listener(_on_publish)
+
+
+def online_summary():
+    return {"online_users": len(_rows), "cached_profiles": len(_profiles),
+            "logged_events": len(_events)}
@@ -0,0 +1,178 @@
+# ==========================================================
+# request_budget.py — Giới hạn thời gian & tải cho /recommend
+# ----------------------------------------------------------
+# - Mỗi request có deadline (budget_ms). CF/CBF chạy trong pool worker;
+#   quá hạn → trả ngay danh sách phổ biến (precompute) kèm nhãn degraded.
+# - Admission control: số phép tính model đồng thời bị chặn ở MAX_IN_FLIGHT
+#   (phép tính bị bỏ dở vẫn giữ slot tới khi xong) → request vượt mức nhận
+#   danh sách phổ biến; quá MAX_PENDING request → từ chối 429.
+# ==========================================================
+
+import contextvars
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from model_state import model_data
+from online_update import get_user_row
+
+# --- Cấu hình ---
+DEFAULT_BUDGET_MS = int(os.environ.get("RECOMMEND_BUDGET_MS", 300))
+MAX_BUDGET_MS = 5000
+MAX_IN_FLIGHT = int(os.environ.get("RECOMMEND_MAX_IN_FLIGHT", 8))    # phép tính CF/CBF cùng lúc
+MAX_PENDING = int(os.environ.get("RECOMMEND_MAX_PENDING", 64))       # request /recommend cùng lúc
+
+# Nhãn chế độ trả về
+MODE_FULL = "hybrid"          # CF + CBF đầy đủ
+MODE_CF_ONLY = "cf_only"      # chỉ CF (hết giờ sau CF / CBF rỗng)
+MODE_CBF_ONLY = "cbf_only"    # chỉ CBF (CF rỗng / CF lỗi)
+MODE_POPULAR = "popular"      # bỏ cả CF/CBF → danh sách phổ biến
+
+
+class Deadline:
+    """Mốc hết hạn của 1 request (tính từ lúc tạo)."""
+
+    def __init__(self, budget_ms):
+        self.start = time.perf_counter()
+        self.budget_ms = budget_ms
+        self.at = self.start + budget_ms / 1000
+
+    def remaining(self):
+        return max(self.at - time.perf_counter(), 0.0)
+
+    def expired(self):
+        return time.perf_counter() >= self.at
+
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self.start) * 1000, 1)
+
+
+# ==========================================================
+# 🚦 Admission control
+# ==========================================================
+class AdmissionController:
+    """Đếm request đang xử lý và slot tính toán model đang bận."""
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_pending=MAX_PENDING):
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self.in_flight = 0            # phép tính CF/CBF đang chạy (kể cả bị bỏ dở)
+        self.pending = 0              # request đang trong /recommend
+        self.served = {}              # đếm theo mode
+        self.degraded = {}            # đếm theo lý do
+        self.rejected = 0
+
+    def enter(self):
+        """Nhận request; False nếu đã quá MAX_PENDING (→ 429)."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.pending -= 1
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record(self, mode, reason=None):
+        with self._lock:
+            self.served[mode] = self.served.get(mode, 0) + 1
+            if reason:
+                self.degraded[reason] = self.degraded.get(reason, 0) + 1
+
+    def status(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "served": dict(self.served),
+                "degraded": dict(self.degraded),
+                "rejected": self.rejected,
+            }
+
+
+admission = AdmissionController()
+_executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="recommend")
+
+
+# ==========================================================
+# 🔥 Gợi ý phổ biến (rẻ: chỉ cắt mảng popular_rank đã precompute)
+# ==========================================================
+def popular_recommendations(user_id, top_n=5):
+    """Top quán phổ biến user chưa tương tác; None nếu model chưa có popular_rank."""
+    rank = model_data.get("popular_rank")
+    popularity = model_data.get("popularity")
+    restaurants = model_data.get("restaurants")
+    if rank is None or popularity is None or restaurants is None or restaurants.empty:
+        return None
+
+    row = get_user_row(user_id)
+    seen = row[0] if row is not None else np.empty(0, dtype=np.int64)
+    pool = rank[:top_n + len(seen)]
+    pool = pool[~np.isin(pool, seen)][:top_n]
+
+    recs = restaurants.iloc[pool][["id", "name"]].reset_index(drop=True)
+    top = max(int(popularity[rank[0]]), 1)
+    recs["score"] = popularity[pool] / top
+    return recs
+
+
+# ==========================================================
+# ⏱️ Chạy gợi ý trong budget
+# ==========================================================
+def _run(compute):
+    try:
+        return compute()
+    finally:
+        admission.release()
+
+
+def recommend_within_budget(compute, user_id, top_n, deadline):
+    """
+    compute(): trả DataFrame (id, name, score); có thể gắn attrs["mode"] (MODE_CF_ONLY /
+    MODE_CBF_ONLY) và attrs["degraded"] (lý do, vd. "cbf_timeout", "cf_error").
+    Trả về (recs, meta) — meta gồm mode, degraded (lý do | None), elapsed_ms.
+    recs = None khi phải degrade mà chưa có danh sách phổ biến.
+    """
+    reason = None
+    if not admission.try_acquire():
+        reason = "overload"
+    else:
+        # Chạy trong ngữ cảnh của request (giữ overlay variant của model_state)
+        future = _executor.submit(contextvars.copy_context().run, _run, compute)
+        try:
+            recs = future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            reason = "timeout"
+        except Exception:
+            print(f"❌ [Recommend] Lỗi khi tính gợi ý user {user_id}:\n{traceback.format_exc()}")
+            reason = "error"
+
+    if reason is None:
+        mode = recs.attrs.get("mode", MODE_FULL)
+        reason = recs.attrs.get("degraded")
+    else:
+        mode = MODE_POPULAR
+        recs = popular_recommendations(user_id, top_n)
+
+    admission.record(mode, reason)
+    return recs, {"mode": mode, "degraded": reason, "elapsed_ms": deadline.elapsed_ms()}
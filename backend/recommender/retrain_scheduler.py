@@ -0,0 +1,149 @@
+# ==========================================================
+# retrain_scheduler.py — Lập lịch huấn luyện lại theo sự kiện
+# ----------------------------------------------------------
+# Laravel gửi "hint" sau mỗi lần ghi review / like / favorite / comment.
+# Scheduler gom (debounce) các hint dồn dập thành 1 vòng huấn luyện:
+# - chờ yên DEBOUNCE giây sau hint cuối (tối đa MAX_DELAY giây)
+# - cách vòng trước ít nhất MIN_GAP giây (giãn thêm nếu vòng trước chậm / lỗi)
+# - không có hint vẫn train lại sau MAX_STALENESS giây để đối soát
+# Hint đến khi đang train được giữ lại → đúng 1 vòng bù sau đó.
+# ==========================================================
+
+import os
+import threading
+import time
+
+# --- Tham số mặc định ---
+DEBOUNCE = 2           # giây yên lặng sau hint cuối trước khi train
+MAX_DELAY = 30         # hint không bị debounce hoãn quá ngần này
+MIN_GAP = 10           # giây tối thiểu giữa 2 vòng
+MAX_STALENESS = 600    # không có hint vẫn train lại sau ngần này
+BACKOFF_FACTOR = 2     # gap >= BACKOFF_FACTOR × thời gian vòng trước
+POLL_INTERVAL = 0.5    # chu kỳ kiểm tra file hint (chế độ tiến trình riêng)
+
+HINT_FILE = "refresh-hint"
+
+
+def touch_hint_file(directory):
+    """Phía Flask (trainer ở tiến trình khác): báo hint bằng cách cập nhật mtime."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, HINT_FILE)
+    with open(path, "a"):
+        os.utime(path)
+
+
+class RetrainScheduler:
+    """
+    Quyết định khi nào chạy vòng huấn luyện tiếp theo.
+    - clock: hàm trả thời điểm hiện tại (giây) — mặc định time.time, test truyền đồng hồ giả
+    """
+
+    def __init__(self, debounce=DEBOUNCE, max_delay=MAX_DELAY, min_gap=MIN_GAP,
+                 max_staleness=MAX_STALENESS, backoff_factor=BACKOFF_FACTOR,
+                 hint_dir=None, clock=time.time):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.min_gap = min_gap
+        self.max_staleness = max_staleness
+        self.backoff_factor = backoff_factor
+        self.hint_path = os.path.join(hint_dir, HINT_FILE) if hint_dir else None
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.first_hint = None       # hint đầu tiên chưa được xử lý
+        self.last_hint = None        # hint gần nhất chưa được xử lý
+        self.pending_hints = 0
+        self.hint_sources = {}       # đếm hint theo loại (review, like...)
+        self.running = False
+        self.last_start = None
+        self.last_end = None
+        self.last_duration = 0.0
+        self.failures = 0            # số vòng lỗi liên tiếp
+        self._hint_mtime = self._read_hint_mtime()
+
+    # ------------------------------------------------------
+    def hint(self, source="unknown", at=None):
+        """Ghi nhận 1 hint (đã có dữ liệu mới trong DB)."""
+        at = at or self._clock()
+        with self._lock:
+            if self.first_hint is None:
+                self.first_hint = at
+            self.last_hint = max(self.last_hint or at, at)
+            self.pending_hints += 1
+            self.hint_sources[source] = self.hint_sources.get(source, 0) + 1
+        self._wake.set()
+
+    def _read_hint_mtime(self):
+        if not self.hint_path:
+            return None
+        try:
+            return os.path.getmtime(self.hint_path)
+        except OSError:
+            return None
+
+    def _poll_hint_file(self):
+        mtime = self._read_hint_mtime()
+        if mtime is not None and (self._hint_mtime is None or mtime > self._hint_mtime):
+            self._hint_mtime = mtime
+            self.hint("file", at=mtime)
+
+    # ------------------------------------------------------
+    def seconds_until_due(self, now=None):
+        """Số giây còn lại tới vòng kế tiếp (0 = chạy ngay)."""
+        now = now or self._clock()
+        with self._lock:
+            if self.last_end is None:
+                return 0.0     # vòng đầu tiên chạy ngay khi khởi động
+
+            # Giãn cách: vòng chậm → chờ lâu hơn; lỗi liên tiếp → nhân đôi
+            gap = max(self.min_gap, self.backoff_factor * self.last_duration)
+            gap = min(gap * (2 ** self.failures), self.max_staleness)
+            earliest = self.last_end + gap
+
+            if self.first_hint is None:
+                due = self.last_end + self.max_staleness
+            else:
+                due = min(self.last_hint + self.debounce, self.first_hint + self.max_delay)
+            return max(max(due, earliest) - now, 0.0)
+
+    def wait_until_due(self):
+        """Chặn tới khi đến lúc train (được đánh thức sớm khi có hint)."""
+        while True:
+            self._poll_hint_file()
+            delay = self.seconds_until_due()
+            if delay <= 0:
+                return
+            wait = min(delay, POLL_INTERVAL) if self.hint_path else delay
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def cycle_started(self):
+        """Các hint tới thời điểm này được gom vào vòng sắp chạy."""
+        with self._lock:
+            self.running = True
+            self.last_start = self._clock()
+            self.first_hint = self.last_hint = None
+            self.pending_hints = 0
+
+    def cycle_finished(self, ok):
+        with self._lock:
+            self.running = False
+            self.last_end = self._clock()
+            self.last_duration = self.last_end - self.last_start
+            self.failures = 0 if ok else self.failures + 1
+            if not ok and self.first_hint is None:
+                # Lỗi → thử lại theo backoff thay vì chờ MAX_STALENESS
+                self.first_hint = self.last_hint = self.last_end
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "pending_hints": self.pending_hints,
+                "hint_sources": dict(self.hint_sources),
+                "last_start": self.last_start,
+                "last_end": self.last_end,
+                "last_duration": round(self.last_duration, 3),
+                "failures": self.failures,
+            }
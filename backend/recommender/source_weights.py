@@ -0,0 +1,167 @@
+# ==========================================================
+# source_weights.py — Ma trận hành vi tách theo nguồn + trọng số chỉnh nóng
+# ----------------------------------------------------------
+# Trainer giữ riêng tổng rating / số hành vi của từng nguồn (reviews,
+# favorites, likes, comments) trên cùng 1 cấu trúc thưa (users × quán).
+# Ma trận gộp = tổ hợp tuyến tính có trọng số → đổi trọng số chỉ cần tính lại
+# trong RAM (vài phép cộng mảng), không phải tải lại DB.
+# Trọng số: DEFAULT_SOURCE_WEIGHTS ← env RECOMMENDER_SOURCE_WEIGHTS (JSON)
+#           ← file WEIGHTS_FILE trong thư mục artifact (ghi bởi endpoint admin).
+# ==========================================================
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_loader import DEFAULT_SOURCE_WEIGHTS, source_values
+
+WEIGHTS_FILE = "source-weights.json"
+
+_lock = threading.Lock()
+_weights = {**DEFAULT_SOURCE_WEIGHTS,
+            **json.loads(os.environ.get("RECOMMENDER_SOURCE_WEIGHTS") or "{}")}
+
+
+# ==========================================================
+# ⚖️ Trọng số hiện hành
+# ==========================================================
+def validate_weights(weights):
+    """Chuẩn hóa {nguồn: số >= 0}; raise ValueError nếu sai tên / giá trị / toàn 0."""
+    if not isinstance(weights, dict) or not weights:
+        raise ValueError("weights phải là object {nguồn: trọng số}")
+    unknown = set(weights) - set(DEFAULT_SOURCE_WEIGHTS)
+    if unknown:
+        raise ValueError(f"nguồn không hợp lệ: {', '.join(sorted(unknown))} "
+                         f"(chọn: {', '.join(DEFAULT_SOURCE_WEIGHTS)})")
+    try:
+        cleaned = {name: float(value) for name, value in weights.items()}
+    except (TypeError, ValueError):
+        raise ValueError("trọng số phải là số")
+    if any(not np.isfinite(v) or v < 0 for v in cleaned.values()):
+        raise ValueError("trọng số phải là số không âm")
+    if not any({**current_weights(), **cleaned}.values()):
+        raise ValueError("cần ít nhất 1 nguồn có trọng số > 0")
+    return cleaned
+
+
+def current_weights(directory=None):
+    """Trọng số đang dùng; nếu có `directory` thì đọc thêm file do Flask ghi (trainer tiến trình riêng)."""
+    if directory:
+        path = os.path.join(directory, WEIGHTS_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+            with _lock:
+                _weights.update({k: float(v) for k, v in stored.items() if k in _weights})
+        except (OSError, ValueError):
+            pass
+    with _lock:
+        return dict(_weights)
+
+
+def set_weights(weights, directory=None):
+    """Cập nhật trọng số (đã validate); ghi file để trainer ở tiến trình khác cùng dùng."""
+    with _lock:
+        _weights.update(weights)
+        snapshot = dict(_weights)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, WEIGHTS_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+    return snapshot
+
+
+# ==========================================================
+# 🧱 Ma trận theo nguồn trên cấu trúc thưa chung
+# ==========================================================
+class SourceMatrices:
+    """
+    Cấu trúc (rows, cols) = hợp mọi cặp (user, quán) của tất cả nguồn, sắp theo hàng.
+    values[nguồn] / counts[nguồn]: mảng dài nnz (0 nếu nguồn đó không có cặp này).
+    """
+
+    def __init__(self, user_ids, item_ids, rows, cols, values, counts):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.rows = rows
+        self.cols = cols
+        self.values = values      # tổng giá trị gốc: tổng sao (reviews) / số hành vi
+        self.counts = counts
+
+    @classmethod
+    def build(cls, sources, item_ids):
+        """sources: dict tên -> DataFrame (user_id, restaurant_id, rating_sum, count)."""
+        item_ids = np.asarray(item_ids)
+        n_items = len(item_ids)
+        # Bỏ hành vi trên quán không còn trong danh sách (đã xóa)
+        sources = {name: frame[frame["restaurant_id"].isin(item_ids)]
+                   for name, frame in sources.items()}
+        user_ids = np.unique(np.concatenate(
+            [frame["user_id"].to_numpy(np.int64) for frame in sources.values()] or [[]]
+        )).astype(np.int64)
+
+        keys = {
+            name: np.searchsorted(user_ids, frame["user_id"].to_numpy(np.int64)) * n_items
+            + np.searchsorted(item_ids, frame["restaurant_id"].to_numpy())
+            for name, frame in sources.items()
+        }
+        pattern = np.unique(np.concatenate(list(keys.values()) or [[]])).astype(np.int64)
+
+        values, counts = {}, {}
+        for name, frame in sources.items():
+            pos = np.searchsorted(pattern, keys[name])
+            values[name] = np.zeros(len(pattern), np.float64)
+            counts[name] = np.zeros(len(pattern), np.int32)
+            np.add.at(values[name], pos, source_values(name, frame, 1.0))
+            np.add.at(counts[name], pos, frame["count"].to_numpy(np.int32))
+
+        return cls(user_ids, item_ids, pattern // n_items, pattern % n_items, values, counts)
+
+    def combine(self, weights):
+        """
+        Ma trận gộp theo trọng số: rating = Σ w·values / Σ counts (nguồn w > 0).
+        Trả về dict user_index, item_ids, user_item_sparse, user_item_counts, all_data.
+        user_index chỉ gồm user còn hành vi sau khi gộp (user chỉ có nguồn w = 0 → cold-start).
+        """
+        numerator = np.zeros(len(self.rows), np.float64)
+        denominator = np.zeros(len(self.rows), np.int32)
+        for name, weight in weights.items():
+            if weight > 0 and name in self.values:
+                numerator += weight * self.values[name]
+                denominator += self.counts[name]
+
+        keep = denominator > 0
+        rows, cols = self.rows[keep], self.cols[keep]
+        ratings = (numerator[keep] / denominator[keep]).astype(np.float32)
+        counts = denominator[keep]
+
+        shape = (len(self.user_ids), len(self.item_ids))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=shape[0]))])
+        user_item = sparse.csr_matrix((ratings, cols, indptr), shape=shape)
+        user_item_counts = sparse.csr_matrix((counts, cols.copy(), indptr.copy()), shape=shape)
+
+        return {
+            "user_index": {int(self.user_ids[i]): int(i) for i in np.unique(rows)},
+            "item_ids": self.item_ids,
+            "user_item_sparse": user_item,
+            "user_item_counts": user_item_counts,
+            "all_data": pd.DataFrame({
+                "user_id": self.user_ids[rows],
+                "restaurant_id": self.item_ids[cols],
+                "rating": ratings,
+                "count": counts,
+            }),
+        }
+
+    def summary(self):
+        """Số cặp (user, quán) và số hành vi của từng nguồn."""
+        return {name: {"pairs": int((self.counts[name] > 0).sum()),
+                       "events": int(self.counts[name].sum())}
+                for name in self.counts}
@@ -0,0 +1,77 @@
+# ==========================================================
+# test_feed.py — Kiểm tra cursor và cache danh sách của /feed
+# ----------------------------------------------------------
+# Chạy: python -m pytest -q test_feed.py (không cần MySQL / model đã train)
+# ==========================================================
+
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from feed import CursorError, FeedCache, decode_cursor, encode_cursor, feed_key
+
+
+def entry(n=3, degraded=None):
+    return np.arange(n, dtype=np.int32), np.ones(n, np.float32), "hybrid", degraded
+
+
+def test_cursor_round_trip():
+    key = feed_key("control", "user", 0.6, 0.4)
+    cursor = encode_cursor(42, (3, 1), key, 20)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor   # an toàn trên URL
+    assert decode_cursor(cursor, 42) == ((3, 1), ["control", "user", 0.6, 0.4], 20)
+
+
+def test_cursor_of_other_user_is_rejected():
+    cursor = encode_cursor(42, (3, 0), feed_key("control", "user", 0.6, 0.4), 10)
+    with pytest.raises(CursorError, match="không thuộc user"):
+        decode_cursor(cursor, 43)
+
+
+@pytest.mark.parametrize("payload", [
+    b"not json",
+    json.dumps([42, [3, 0], ["control", "user", 0.6]]).encode(),          # thiếu phần tử key
+    json.dumps([42, [3, 0], ["control", "user", 0.6, 0.4], -1]).encode(),   # offset âm
+    json.dumps([42, "3", ["control", "user", 0.6, 0.4], 0]).encode(),     # revision sai kiểu
+])
+def test_malformed_cursor_is_rejected(payload):
+    cursor = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, 42)
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(CursorError):
+        decode_cursor("!!!", 42)
+
+
+def test_cache_is_keyed_by_revision_and_params():
+    cache = FeedCache()
+    key = feed_key("control", "user", 0.6, 0.4)
+    cache.put(1, (3, 0), key, entry())
+    assert cache.get(1, (3, 0), key) is not None
+    assert cache.get(1, (3, 1), key) is None
+    assert cache.get(1, (3, 0), feed_key("control", "item", 0.6, 0.4)) is None
+    assert cache.status()["hits"] == 1 and cache.status()["misses"] == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = FeedCache(max_entries=2)
+    key = feed_key("control", "user", 0.6, 0.4)
+    cache.put(1, (1, 0), key, entry())
+    cache.put(2, (1, 0), key, entry())
+    cache.get(1, (1, 0), key)                    # user 1 vừa dùng → user 2 bị đẩy ra
+    cache.put(3, (1, 0), key, entry())
+    assert cache.get(2, (1, 0), key) is None
+    assert cache.get(1, (1, 0), key) is not None
+
+
+def test_degraded_entry_expires():
+    cache = FeedCache(degraded_ttl=0)
+    key = feed_key("control", "user", 0.6, 0.4)
+    cache.put(1, (1, 0), key, entry(degraded="timeout"))
+    cache.put(2, (1, 0), key, entry())
+    assert cache.get(1, (1, 0), key) is None
+    assert cache.get(2, (1, 0), key) is not None     # danh sách đầy đủ không hết hạn
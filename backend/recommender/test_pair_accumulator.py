@@ -0,0 +1,88 @@
+# ==========================================================
+# test_pair_accumulator.py — Kiểm tra gộp dần theo cặp (user, quán) khi đọc streaming
+# ----------------------------------------------------------
+# Chạy: python -m pytest -q test_pair_accumulator.py (không cần MySQL)
+# So kết quả PairAccumulator với groupby của pandas trên cùng dữ liệu.
+# ==========================================================
+
+import numpy as np
+import pandas as pd
+
+from data_loader import PairAccumulator
+
+
+def random_rows(rng, n, users=30, items=20):
+    return pd.DataFrame({
+        "user_id": rng.integers(1, users + 1, n).astype(np.int32),
+        "restaurant_id": rng.integers(1, items + 1, n).astype(np.int32),
+        "rating": rng.integers(1, 6, n).astype(np.float32),
+    })
+
+
+def add_frame(acc, frame):
+    acc.add(frame["user_id"].to_numpy(), frame["restaurant_id"].to_numpy(),
+            frame["rating"].to_numpy())
+
+
+def expected(frame):
+    return (frame.groupby(["user_id", "restaurant_id"])
+            .agg(rating_sum=("rating", "sum"), rating=("rating", "mean"),
+                 count=("rating", "size"))
+            .reset_index())
+
+
+def assert_matches(acc, frame):
+    ref = expected(frame)
+    mean = acc.to_frame()
+    totals = acc.to_frame(totals=True)
+    assert mean[["user_id", "restaurant_id"]].values.tolist() == \
+        ref[["user_id", "restaurant_id"]].values.tolist()
+    np.testing.assert_allclose(mean["rating"], ref["rating"], rtol=1e-6)
+    np.testing.assert_allclose(totals["rating_sum"], ref["rating_sum"], rtol=1e-6)
+    np.testing.assert_array_equal(mean["count"], ref["count"])
+
+
+def test_chunks_round_trip_to_groupby():
+    rng = np.random.default_rng(0)
+    frame = random_rows(rng, 2000)
+    acc = PairAccumulator(capacity=4)            # ép tăng dung lượng nhiều lần
+    for start in range(0, len(frame), 137):
+        add_frame(acc, frame.iloc[start:start + 137])
+    assert_matches(acc, frame)
+
+
+def test_merge_equals_single_accumulator():
+    rng = np.random.default_rng(1)
+    left, right = random_rows(rng, 500), random_rows(rng, 700)
+    a, b = PairAccumulator(), PairAccumulator()
+    add_frame(a, left)
+    add_frame(b, right)
+    a.merge(b)
+    assert_matches(a, pd.concat([left, right], ignore_index=True))
+
+
+def test_merge_into_empty_and_from_empty():
+    rng = np.random.default_rng(2)
+    frame = random_rows(rng, 300)
+    full, empty = PairAccumulator(), PairAccumulator()
+    add_frame(full, frame)
+    empty.merge(full)
+    full.merge(PairAccumulator())
+    assert_matches(empty, frame)
+    assert_matches(full, frame)
+
+
+def test_large_ids_keep_pairs_apart():
+    acc = PairAccumulator()
+    big = np.iinfo(np.int32).max
+    acc.add(np.array([big, 1, big]), np.array([1, big, 1]), np.array([4.0, 2.0, 2.0]))
+    frame = acc.to_frame()
+    assert frame[["user_id", "restaurant_id"]].values.tolist() == [[1, big], [big, 1]]
+    assert frame["rating"].tolist() == [2.0, 3.0]
+    assert frame["count"].tolist() == [1, 2]
+
+
+def test_empty_accumulator_frame():
+    frame = PairAccumulator().to_frame()
+    assert frame.empty
+    assert list(frame.columns) == ["user_id", "restaurant_id", "rating", "count"]
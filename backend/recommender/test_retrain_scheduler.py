@@ -0,0 +1,132 @@
+# ==========================================================
+# test_retrain_scheduler.py — Kiểm tra lịch train lại (debounce / gap / backoff)
+# ----------------------------------------------------------
+# Chạy: python -m pytest -q test_retrain_scheduler.py
+# Dùng đồng hồ giả → không phải sleep, kết quả tất định.
+# ==========================================================
+
+import pytest
+
+from retrain_scheduler import RetrainScheduler, touch_hint_file
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_scheduler(clock, **kwargs):
+    params = dict(debounce=2, max_delay=30, min_gap=10, max_staleness=600, backoff_factor=2)
+    params.update(kwargs)
+    return RetrainScheduler(clock=clock, **params)
+
+
+def run_cycle(scheduler, clock, duration=1.0, ok=True):
+    scheduler.cycle_started()
+    clock.advance(duration)
+    scheduler.cycle_finished(ok)
+
+
+def test_first_cycle_runs_immediately(clock):
+    assert make_scheduler(clock).seconds_until_due() == 0.0
+
+
+def test_without_hints_waits_max_staleness(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock)
+    assert scheduler.seconds_until_due() == pytest.approx(600)
+    clock.advance(599)
+    assert scheduler.seconds_until_due() == pytest.approx(1)
+
+
+def test_hint_is_debounced(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock)
+    clock.advance(60)
+    scheduler.hint("review")
+    assert scheduler.seconds_until_due() == pytest.approx(2)
+    clock.advance(1)
+    scheduler.hint("like")           # hint mới → chờ yên lại từ đầu
+    assert scheduler.seconds_until_due() == pytest.approx(2)
+    assert scheduler.status()["pending_hints"] == 2
+    assert scheduler.status()["hint_sources"] == {"review": 1, "like": 1}
+
+
+def test_max_delay_caps_debounce(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock)
+    clock.advance(60)
+    for _ in range(40):               # hint liên tục mỗi giây
+        scheduler.hint("review")
+        clock.advance(1)
+    # hint đầu ở giây 0 → hạn chót giây 30, đã qua → chạy ngay
+    assert scheduler.seconds_until_due() == 0.0
+
+
+def test_min_gap_after_previous_cycle(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock)
+    scheduler.hint("review")
+    assert scheduler.seconds_until_due() == pytest.approx(10)
+
+
+def test_slow_cycle_stretches_gap(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock, duration=20)
+    scheduler.hint("review")
+    assert scheduler.seconds_until_due() == pytest.approx(40)     # 2 × thời gian vòng trước
+
+
+def test_failures_back_off_exponentially(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock, ok=False)
+    # Lỗi → tự đặt lịch thử lại (không chờ MAX_STALENESS), gap × 2
+    assert scheduler.seconds_until_due() == pytest.approx(20)
+    clock.advance(20)
+    run_cycle(scheduler, clock, ok=False)
+    assert scheduler.seconds_until_due() == pytest.approx(40)
+    clock.advance(40)
+    run_cycle(scheduler, clock, ok=True)
+    assert scheduler.status()["failures"] == 0
+    assert scheduler.seconds_until_due() == pytest.approx(600)
+
+
+def test_backoff_is_capped_by_max_staleness(clock):
+    scheduler = make_scheduler(clock, max_staleness=100)
+    for _ in range(6):
+        run_cycle(scheduler, clock, ok=False)
+    assert scheduler.seconds_until_due() == pytest.approx(100)
+
+
+def test_hint_during_cycle_triggers_one_more(clock):
+    scheduler = make_scheduler(clock)
+    run_cycle(scheduler, clock)
+    clock.advance(60)
+    scheduler.cycle_started()
+    clock.advance(0.5)
+    scheduler.hint("favorite")        # tới khi đang train → giữ lại cho vòng sau
+    clock.advance(0.5)
+    scheduler.cycle_finished(True)
+    assert scheduler.status()["pending_hints"] == 1
+    assert scheduler.seconds_until_due() == pytest.approx(10)
+
+
+def test_hint_file_is_picked_up(tmp_path, clock):
+    scheduler = make_scheduler(clock, hint_dir=str(tmp_path))
+    run_cycle(scheduler, clock)
+    touch_hint_file(str(tmp_path))
+    scheduler._poll_hint_file()
+    assert scheduler.status()["hint_sources"] == {"file": 1}
+    scheduler._poll_hint_file()       # mtime không đổi → không tính lại
+    assert scheduler.status()["pending_hints"] == 1
@@ -0,0 +1,61 @@
+# ==========================================================
+# test_variants.py — Kiểm tra chia user giữa các variant (A/B)
+# ----------------------------------------------------------
+# Chạy: python -m pytest -q test_variants.py (không cần MySQL / model đã train)
+# ==========================================================
+
+import numpy as np
+import pytest
+
+from model_state import bind_model
+from variants import VariantRegistry, parse_active
+
+USERS = range(1, 20_001)
+
+
+def shares(registry):
+    names = [registry.route(u) for u in USERS]
+    return {name: names.count(name) / len(names) for name, _ in registry.active}
+
+
+def test_route_is_stable():
+    a, b = VariantRegistry("control:50,mf:50"), VariantRegistry("control:50,mf:50")
+    assert [a.route(u) for u in range(200)] == [b.route(u) for u in range(200)]
+
+
+def test_route_follows_shares():
+    split = shares(VariantRegistry("control:50,mf:25,top_users_20:25"))
+    assert split["control"] == pytest.approx(0.50, abs=0.02)
+    assert split["mf"] == pytest.approx(0.25, abs=0.02)
+    assert split["top_users_20"] == pytest.approx(0.25, abs=0.02)
+
+
+def test_single_and_zero_share():
+    assert {VariantRegistry("control").route(u) for u in range(500)} == {"control"}
+    assert {VariantRegistry("control:1,mf:0").route(u) for u in range(500)} == {"control"}
+
+
+def test_salt_reshuffles_users():
+    a = VariantRegistry("control:50,mf:50", salt="a")
+    b = VariantRegistry("control:50,mf:50", salt="b")
+    moved = sum(a.route(u) != b.route(u) for u in range(2000)) / 2000
+    assert 0.3 < moved < 0.7
+
+
+@pytest.mark.parametrize("spec", ["unknown:1", "control:0", ""])
+def test_parse_active_rejects_bad_spec(spec):
+    with pytest.raises(ValueError):
+        parse_active(spec)
+
+
+def test_supports_reads_overlay_of_bound_snapshot():
+    registry = VariantRegistry("control:50,mf:50")
+    snapshot = {"variant_overlays": {"control": {"variant": "control"},
+                                     "mf": {"variant": "mf", "cf_mode": "mf",
+                                            "item_factors": np.zeros((3, 2), np.float32)}}}
+    with bind_model(snapshot):
+        assert registry.supports("mf", "mf")
+        assert not registry.supports("control", "mf")
+        assert registry.supports("control", "user")
+    with bind_model({"variant_overlays": {}}):
+        assert not registry.supports("mf", "mf")
@@ -0,0 +1,209 @@
+# ==========================================================
+# text_features.py — Vector hóa văn bản không cần từ điển (hashing)
+# ----------------------------------------------------------
+# Thay TfidfVectorizer (từ điển lớn dần theo số quán, phải fit lại toàn bộ)
+# bằng HashingVectorizer: số chiều cố định, IDF được duy trì riêng và
+# làm mới định kỳ → RAM không tăng theo catalog, quán mới vector hóa ngay
+# bằng IDF hiện hành mà không phải fit lại.
+# ==========================================================
+
+import hashlib
+import re
+import unicodedata
+from functools import partial
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# --- Cấu hình ---
+HASHING_FEATURES = 2 ** 18    # số bucket cố định
+STRIP_DIACRITICS = False      # True: "phở" ≡ "pho" (người dùng gõ không dấu)
+IDF_REFRESH_CYCLES = 50       # áp IDF mới cho mọi quán sau ngần này vòng
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ==========================================================
+# 🔤 Tokenizer tiếng Việt
+# ==========================================================
+def strip_vietnamese_diacritics(text):
+    """Bỏ dấu tiếng Việt: 'Bún chả Đống Đa' → 'Bun cha Dong Da'."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def vietnamese_analyzer(text, strip_diacritics=STRIP_DIACRITICS):
+    """
+    Tách từ cho tiếng Việt: chuẩn hóa Unicode (NFC — gõ dựng sẵn/tổ hợp như nhau),
+    chữ thường, tách theo \\w+, sinh unigram + bigram (từ ghép 2 âm tiết: "bún chả").
+    """
+    text = unicodedata.normalize("NFC", text or "").lower()
+    if strip_diacritics:
+        text = strip_vietnamese_diacritics(text)
+    tokens = _TOKEN_RE.findall(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def make_hashing_vectorizer(n_features=HASHING_FEATURES, strip_diacritics=STRIP_DIACRITICS):
+    """HashingVectorizer trả về số lần xuất hiện (chưa IDF, chưa chuẩn hóa)."""
+    return HashingVectorizer(
+        n_features=n_features,
+        analyzer=partial(vietnamese_analyzer, strip_diacritics=strip_diacritics),
+        alternate_sign=False,
+        norm=None,
+    )
+
+
+# ==========================================================
+# 📚 IDF duy trì riêng, làm mới định kỳ
+# ==========================================================
+class HashingFeatureState:
+    """
+    Giữ vector TF-IDF (đã hash, chuẩn hóa L2) của từng quán + document frequency theo bucket.
+    - Mỗi vòng chỉ vector hóa quán mới / quán đổi nội dung, bằng IDF đang cố định
+      → vector các quán khác giữ nguyên giữa 2 lần làm mới IDF.
+    - df cập nhật dần (quán bị xóa được trừ ra); cứ idf_refresh vòng thì áp IDF mới
+      cho mọi quán (chỉ đổi tỉ lệ theo bucket, không hash lại văn bản).
+    - Phát hiện đổi nội dung bằng digest văn bản, không giữ nguyên văn.
+    """
+
+    def __init__(self, n_features=HASHING_FEATURES, strip_diacritics=STRIP_DIACRITICS,
+                 idf_refresh=IDF_REFRESH_CYCLES):
+        self.vectorizer = make_hashing_vectorizer(n_features, strip_diacritics)
+        self.n_features = n_features
+        self.idf_refresh = idf_refresh
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.rows = {}        # restaurant_id -> (digest, csr 1×n_features đã nhân IDF, chuẩn hóa)
+        self._idf = None      # IDF đang dùng (cố định tới lần làm mới kế tiếp)
+        self._cycles = 0
+
+    def update(self, restaurant_ids, texts):
+        """Đồng bộ với catalog hiện tại. Trả về số quán phải vector hóa lại."""
+        current = {rid: _digest(text) for rid, text in zip(restaurant_ids, texts)}
+        texts = dict(zip(restaurant_ids, texts))
+
+        for rid in [rid for rid in self.rows if rid not in current]:
+            self._remove(rid)
+
+        changed = [rid for rid, digest in current.items()
+                   if rid not in self.rows or self.rows[rid][0] != digest]
+        counts = (self.vectorizer.transform([texts[rid] for rid in changed]).tocsr()
+                  if changed else None)
+        for i, rid in enumerate(changed):
+            if rid in self.rows:
+                self._remove(rid)
+            self.df[counts[i].indices] += 1
+
+        if self._idf is None or self._cycles % self.idf_refresh == 0:
+            self._refresh_idf(len(current))
+        self._cycles += 1
+        if changed:
+            # Quán mới / đổi nội dung: nhân IDF đang cố định, không đụng tới quán khác
+            weighted = self._weight(counts)
+            for i, rid in enumerate(changed):
+                self.rows[rid] = (current[rid], weighted[i])
+        return len(changed)
+
+    def _remove(self, rid):
+        _, row = self.rows.pop(rid)
+        self.df[row.indices] -= 1
+
+    def idf(self, n_docs=None):
+        """IDF làm mượt giống sklearn: log((1 + n) / (1 + df)) + 1 (theo df hiện tại)."""
+        n_docs = len(self.rows) if n_docs is None else n_docs
+        return (np.log((1 + n_docs) / (1 + self.df)) + 1).astype(np.float32)
+
+    def _refresh_idf(self, n_docs):
+        """Áp IDF mới cho mọi quán đã có: vector ∝ đếm × IDF → đổi tỉ lệ rồi chuẩn hóa lại."""
+        new_idf = self.idf(n_docs)
+        if self._idf is not None and self.rows:
+            ratio = sparse.diags(new_idf / self._idf)
+            ids = list(self.rows)
+            weighted = normalize((sparse.vstack([self.rows[rid][1] for rid in ids]) @ ratio).tocsr(),
+                                 norm="l2", axis=1)
+            for i, rid in enumerate(ids):
+                self.rows[rid] = (self.rows[rid][0], weighted[i])
+        self._idf = new_idf
+
+    def transform(self, restaurant_ids):
+        """Ma trận TF-IDF (chuẩn hóa L2 theo hàng) cho các quán đã có trong state."""
+        return sparse.vstack([self.rows[rid][1] for rid in restaurant_ids]).tocsr()
+
+    def _weight(self, counts):
+        weighted = counts.astype(np.float32) @ sparse.diags(self._idf)
+        return normalize(weighted.tocsr(), norm="l2", axis=1)
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+# ==========================================================
+# 💬 Nội dung review gộp theo quán (cập nhật dần)
+# ==========================================================
+class ReviewTextAggregates:
+    """
+    Tổng vector (hash, chuẩn hóa L2 từng review) + số review của mỗi quán.
+    Review mới chỉ cộng vào vector của đúng quán đó; df theo review cũng cộng dồn,
+    nên không phải vector hóa lại toàn bộ review / catalog.
+    """
+
+    def __init__(self, n_features=HASHING_FEATURES, strip_diacritics=STRIP_DIACRITICS):
+        self.vectorizer = make_hashing_vectorizer(n_features, strip_diacritics)
+        self.n_features = n_features
+        self.sums = {}            # restaurant_id -> csr 1×n_features
+        self.counts = {}          # restaurant_id -> số review
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_reviews = 0
+        self.last_review_id = 0   # id review lớn nhất đã gộp (load tiếp từ đây)
+
+    def add_reviews(self, reviews):
+        """reviews: DataFrame (id, restaurant_id, content). Trả về số quán bị ảnh hưởng."""
+        if reviews.empty:
+            return 0
+        self.last_review_id = max(self.last_review_id, int(reviews["id"].max()))
+        reviews = reviews[reviews["content"].fillna("").str.strip() != ""]
+        if reviews.empty:
+            return 0
+        counts = self.vectorizer.transform(reviews["content"].tolist()).tocsr()
+        self.df += np.diff(sparse.csc_matrix(counts > 0).indptr).astype(np.int32)
+        self.n_reviews += counts.shape[0]
+
+        # Cộng theo quán: ma trận chỉ báo (quán × review) @ vector review
+        vectors = normalize(counts.astype(np.float32), norm="l2", axis=1)
+        rids, owner = np.unique(reviews["restaurant_id"].to_numpy(), return_inverse=True)
+        indicator = sparse.csr_matrix(
+            (np.ones(len(owner), np.float32), (owner, np.arange(len(owner)))),
+            shape=(len(rids), len(owner))
+        )
+        per_restaurant = (indicator @ vectors).tocsr()
+        n_new = np.bincount(owner)
+        for i, rid in enumerate(rids.tolist()):
+            row = per_restaurant[i]
+            self.sums[rid] = self.sums[rid] + row if rid in self.sums else row
+            self.counts[rid] = self.counts.get(rid, 0) + int(n_new[i])
+        return len(rids)
+
+    def matrix(self, restaurant_ids):
+        """Ma trận (quán × n_features): trung bình review × IDF, chuẩn hóa L2. Quán chưa có review = 0."""
+        empty = sparse.csr_matrix((1, self.n_features), dtype=np.float32)
+        rows = [self.sums[rid] / self.counts[rid] if rid in self.sums else empty
+                for rid in restaurant_ids]
+        idf = (np.log((1 + self.n_reviews) / (1 + self.df)) + 1).astype(np.float32)
+        weighted = sparse.vstack(rows).tocsr() @ sparse.diags(idf)
+        return normalize(weighted.tocsr(), norm="l2", axis=1)
+
+
+def blend_features(item_features, review_features, review_weight):
+    """
+    Ghép đặc trưng quán + đặc trưng review: [√(1-w)·A, √w·B] (mỗi khối chuẩn hóa hàng).
+    Với 2 quán đều có review: cosine = (1-w)·cos_A + w·cos_B.
+    """
+    item_features = normalize(item_features, norm="l2", axis=1)
+    return sparse.hstack([
+        np.sqrt(1 - review_weight) * item_features,
+        np.sqrt(review_weight) * review_features,
+    ]).tocsr().astype(np.float32)
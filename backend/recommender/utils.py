@@ -1,5 +1,15 @@
+import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 
 def compute_similarity(matrix):
     """Tính cosine similarity cho ma trận"""
     return cosine_similarity(matrix)
+
+
+def top_k_indices(scores, k):
+    """Index của k điểm cao nhất (giảm dần) — argpartition O(n) thay vì argsort toàn bộ."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
@@ -0,0 +1,121 @@
+# ==========================================================
+# variants.py — Chạy song song nhiều biến thể model (A/B) trong 1 server
+# ----------------------------------------------------------
+# Mỗi variant chỉ là overlay (dict các khóa khác với model gốc) dựng từ
+# cùng snapshot đã tải → không thêm truy vấn DB, mảng gốc dùng chung.
+# - /recommend chia user theo hash ổn định (crc32) → luôn cùng 1 variant
+# - Trainer dựng overlay cùng vòng với model gốc (auto_trainer.build_variant_overlays)
+#   và publish chung 1 snapshot → Flask không tính lại gì, overlay luôn khớp model gốc
+#   (trainer chạy riêng cần cùng biến môi trường RECOMMENDER_VARIANTS)
+# - Ghi độ trễ theo variant để so sánh
+# Lưu ý: hàng online (online_update) và bộ đếm phổ biến cập nhật online
+# vẫn theo model gốc; variant có trọng số riêng thấy chúng ở vòng train sau.
+# ==========================================================
+
+import os
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+from model_state import model_data
+
+# --- Định nghĩa các variant (khóa đặc biệt: source_weights, top_similar_users, cf_mode, mf_dim) ---
+VARIANTS = {
+    "control": {},                                           # cf.py như hiện tại
+    "thu1_weights": {                                        # trọng số kiểu thu1.py (rating × WEIGHT_*)
+        "source_weights": {"reviews": 5.0, "favorites": 25.0, "likes": 6.0, "comments": 1.0},
+    },
+    "top_users_20": {"top_similar_users": 20},               # nhiều láng giềng hơn
+    "mf": {"cf_mode": "mf"},                                 # phân rã ma trận thay cho kNN
+}
+
+# Variant đang bật + tỉ lệ traffic: "control:50,mf:50" (mặc định chỉ control)
+ACTIVE_VARIANTS = os.environ.get("RECOMMENDER_VARIANTS", "control")
+ROUTING_SALT = os.environ.get("RECOMMENDER_VARIANT_SALT", "variants-v1")
+LATENCY_WINDOW = 2000      # số request gần nhất giữ lại để tính phân vị độ trễ
+CF_MODE_REQUIRES = {"mf": "item_factors"}   # cf_mode chỉ dùng được khi overlay có khóa này
+_BUCKETS = 10_000
+
+
+def parse_active(spec):
+    """'control:50,mf:50' → [(tên, tỉ lệ)]; bỏ trống tỉ lệ = 1."""
+    active = []
+    for item in (x.strip() for x in spec.split(",")):
+        if not item:
+            continue
+        name, _, share = item.partition(":")
+        if name not in VARIANTS:
+            raise ValueError(f"variant không hợp lệ: {name} (chọn: {', '.join(VARIANTS)})")
+        active.append((name, float(share) if share else 1.0))
+    if not active or sum(share for _, share in active) <= 0:
+        raise ValueError("cần ít nhất 1 variant có tỉ lệ > 0")
+    return active
+
+
+# ==========================================================
+# 🗂️ Registry
+# ==========================================================
+class VariantRegistry:
+    """Chia user theo hash + thống kê các variant đang bật; overlay đọc từ snapshot model."""
+
+    def __init__(self, active=ACTIVE_VARIANTS, salt=ROUTING_SALT):
+        self.active = parse_active(active) if isinstance(active, str) else list(active)
+        self.salt = salt
+        self._lock = threading.Lock()
+        shares = np.array([share for _, share in self.active])
+        self._bounds = np.cumsum(shares / shares.sum() * _BUCKETS)
+        self.stats = {name: {"requests": 0, "degraded": 0, "latency": deque(maxlen=LATENCY_WINDOW)}
+                      for name, _ in self.active}
+
+    def route(self, user_id):
+        """Hash ổn định (crc32, không phụ thuộc PYTHONHASHSEED) → tên variant."""
+        bucket = zlib.crc32(f"{self.salt}:{user_id}".encode()) % _BUCKETS
+        index = int(np.searchsorted(self._bounds, bucket, side="right"))
+        return self.active[min(index, len(self.active) - 1)][0]
+
+    def overlay(self, name):
+        """
+        Overlay trong snapshot model đang gắn cho request (dùng với model_state.model_overlay);
+        None nếu trainer chưa dựng variant này.
+        """
+        return (model_data.get("variant_overlays") or {}).get(name)
+
+    def supports(self, name, cf_mode):
+        """cf_mode có dùng được với variant `name` không (vd. "mf" cần item_factors trong overlay)."""
+        required = CF_MODE_REQUIRES.get(cf_mode)
+        return required is None or (self.overlay(name) or {}).get(required) is not None
+
+    def record(self, name, elapsed_ms, degraded=False):
+        with self._lock:
+            stats = self.stats[name]
+            stats["requests"] += 1
+            stats["degraded"] += bool(degraded)
+            stats["latency"].append(elapsed_ms)
+
+    def status(self):
+        builds = model_data.get("variant_builds") or {}
+        with self._lock:
+            result = {}
+            for name, share in self.active:
+                stats = self.stats[name]
+                build = builds.get(name) or {}
+                latency = np.array(stats["latency"], dtype=float)
+                p50, p95, p99 = (np.percentile(latency, [50, 95, 99]).round(2).tolist()
+                                 if len(latency) else (None, None, None))
+                result[name] = {
+                    "share": share,
+                    "spec": VARIANTS[name],
+                    "build_ms": build.get("build_ms"),
+                    "built_version": model_data["version"] if build else None,
+                    "built_revision": model_data["revision"] if build else None,
+                    "overlay_bytes": build.get("overlay_bytes", 0),
+                    "requests": stats["requests"],
+                    "degraded": stats["degraded"],
+                    "latency_ms": {"p50": p50, "p95": p95, "p99": p99},
+                }
+            return result
+
+
+registry = VariantRegistry()